@@ -1,64 +1,50 @@
-from qdrant_client import models, QdrantClient
-from sentence_transformers import SentenceTransformer
-import json
-
-
-# Initialize the sentence transformer model
-encoder = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Load the JSON data
-with open("Food_recommendation.meal_collection.json", "r") as file:
-    data = json.load(file)
-
-# Prepare documents and payloads in one step
-documents, payloads = [], []
-for restaurant in data:
-    restaurant_name = restaurant['restaurant_name']
-    for product in restaurant['products']:
-        # Create a descriptive string for each product
-        description = (
-            f"{product['name']} with {product['calories']} calories, "
-            f"{product['total fat']} fat, {product['saturated fat']} saturated fat, "
-            f"{product['cholesterol']} cholesterol, {product['total carb']} carbs, "
-            f"{product['dietary fibre']} dietary fibre, {product['sugar']} sugar, "
-            f"{product['protein']} protein"
+from qdrant_client import QdrantClient
+from embedding_cache import get_encoder
+from encoding_pool import EncodingPool
+from meal_ingestion import MEAL_COLLECTION, MEAL_LEXICAL_INDEX_PATH, sync_meals
+from lexical_index import BM25Index
+from meal_loader import iter_restaurants
+import argparse
+
+
+# The guard keeps spawned encoding workers from re-running the sync when they import this module
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Sync the meal catalogue into Qdrant.")
+    parser.add_argument("--recreate", action="store_true", help="Drop and rebuild the collection")
+    parser.add_argument("--quantization", choices=["int8", "binary"], help="Also store quantized vectors when creating the collection")
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes; 0 uses one per CPU core")
+    args = parser.parse_args()
+
+    # Initialize the cached sentence transformer encoder, or a pool of them for large catalogues
+    if args.workers == 1:
+        encoder = get_encoder("all-MiniLM-L6-v2")
+    else:
+        encoder = EncodingPool("all-MiniLM-L6-v2", workers=args.workers or None)
+
+    # Stream restaurants from the JSON export instead of loading it at once
+    data = iter_restaurants("Food_recommendation.meal_collection.json")
+
+    # Initialize the Qdrant client (use a persistent or properly configured in-memory storage)
+    client = QdrantClient(url="http://localhost:6338")
+
+    # Drop the collection first when a full rebuild is requested
+    if args.recreate and client.collection_exists(MEAL_COLLECTION):
+        client.delete_collection(MEAL_COLLECTION)
+
+    # Upsert new or changed meals and delete the ones removed from the catalogue,
+    # rebuilding the BM25 index over meal and restaurant names along the way
+    lexical_index = BM25Index()
+    try:
+        stats = sync_meals(
+            client, encoder, data, collection_name=MEAL_COLLECTION, lexical_index=lexical_index,
+            quantization=args.quantization,
         )
-        documents.append(description)
-        payloads.append({
-            "name": product["name"],
-            "calories": product["calories"],
-            "total_fat": product["total fat"],
-            "saturated_fat": product["saturated fat"],
-            "cholesterol": product["cholesterol"],
-            "total_carb": product["total carb"],
-            "dietary_fibre": product["dietary fibre"],
-            "sugar": product["sugar"],
-            "protein": product["protein"]
-        })
-
-# Batch encode all documents
-document_vectors = encoder.encode(documents, convert_to_tensor=False)
-
-# Initialize the Qdrant client (use a persistent or properly configured in-memory storage)
-client = QdrantClient(url="http://localhost:6338")
-
-
-# Create a collection in Qdrant
-client.create_collection(
-    collection_name="meals",
-    vectors_config=models.VectorParams(
-        size=encoder.get_sentence_embedding_dimension(),  # Vector size defined by model
-        distance=models.Distance.COSINE,
-    ),
-)
-
-# Upload points to the Qdrant collection
-points = [
-    models.PointStruct(
-        id=idx,
-        vector=vector.tolist(),
-        payload=payload
+    finally:
+        if isinstance(encoder, EncodingPool):
+            encoder.close()
+    lexical_index.save(MEAL_LEXICAL_INDEX_PATH)
+    print(
+        f"Meals upserted: {stats['upserted']}, unchanged: {stats['unchanged']}, "
+        f"deleted: {stats['deleted']}"
     )
-    for idx, (vector, payload) in enumerate(zip(document_vectors, payloads))
-]
-client.upload_points(collection_name="meals", points=points)
\ No newline at end of file
@@ -0,0 +1,239 @@
+import argparse
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from embedding_cache import get_encoder
+from main_system import profile_query_data
+from meal_loader import batched
+from meal_planner import parse_plan_request
+from plan_fanout import recommend_plan
+from prompt_builder import build_meal_context
+from query_normalizer import get_query_normalizer
+from recommend_meal import get_lm_studio_session, get_query_from_lm_studio
+from search_backend import get_search_backend
+from user_profile import get_mongo_client
+
+
+def iter_mongo_profiles(db_name="Food_recommendation", collection_name="user_profile", query=None):
+    """
+    Streams user profiles from MongoDB.
+
+    Args:
+        db_name (str): Name of the database.
+        collection_name (str): Name of the profile collection.
+        query (str): Query used for every profile without its own ``query`` field.
+
+    Yields:
+        dict: Profiles with their ``_id`` converted to a string.
+    """
+    collection = get_mongo_client("mongodb://localhost:27017/")[db_name][collection_name]
+    for profile in collection.find({}):
+        profile["_id"] = str(profile["_id"])
+        profile.setdefault("dietary_restrictions", None)
+        profile.setdefault("dietary_preferences", None)
+        if query and not profile.get("query"):
+            profile["query"] = query
+        yield profile
+
+
+def iter_jsonl_profiles(path, query=None):
+    """
+    Streams user profiles from a JSON Lines file.
+
+    Args:
+        path (str): File with one profile object per line, optionally with a ``query`` field.
+        query (str): Query used for every profile without its own ``query`` field.
+
+    Yields:
+        dict: Profiles in file order.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            profile = json.loads(line)
+            profile.setdefault("dietary_restrictions", None)
+            profile.setdefault("dietary_preferences", None)
+            if query and not profile.get("query"):
+                profile["query"] = query
+            yield profile
+
+
+def _hit_summary(hit):
+    return {
+        "restaurant_name": hit.payload.get("restaurant_name"),
+        "name": hit.payload.get("name"),
+        "score": hit.score,
+    }
+
+
+def profile_error(profile):
+    """
+    Checks that a profile has the fields used for its recommendation.
+
+    Args:
+        profile (dict): Profile read from MongoDB or a JSONL file.
+
+    Returns:
+        str | None: Why the profile cannot be processed, or None if it is valid.
+    """
+    for field in ("weight_kg", "height_cm"):
+        value = profile.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            return f"'{field}' must be a positive number."
+    if not isinstance(profile.get("query"), str):
+        return "'query' must be a string."
+    return None
+
+
+def _record(profile, hits=()):
+    return {
+        "user_id": str(profile.get("_id", "")),
+        "name": profile.get("name"),
+        "query": profile.get("query"),
+        "hits": [_hit_summary(hit) for hit in hits],
+    }
+
+
+def _recommend(profile, user_info, hits):
+    record = _record(profile, hits)
+    try:
+        record["answer"] = get_query_from_lm_studio(user_info, build_meal_context(hits))
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def _recommend_plan(profile, encoder, backend, plan_request, limit):
+    # Same per-slot fan-out as the CLI and the service; one LLM call at a time, since
+    # the plan already occupies one of the batch's generation threads
+    try:
+        plan = recommend_plan(
+            profile_query_data(profile), profile["query"], encoder, backend, plan_request, limit, llm_concurrency=1
+        )
+    except Exception as e:
+        return dict(_record(profile), error=str(e))
+    return dict(_record(profile, plan["hits"]), answer=plan["answer"])
+
+
+def run_batch(profiles, output_path, encoder, backend, batch_size=256, limit=20, concurrency=4):
+    """
+    Generates recommendations for many users and streams them to a JSONL file.
+
+    Profiles are processed in batches: all queries of a batch are encoded in
+    one ``encode`` call and searched with one batched search, and LLM
+    generations run on at most ``concurrency`` threads. Each result is written
+    as soon as its generation finishes. Meal plan requests are answered by
+    ``plan_fanout.recommend_plan`` on a generation thread instead, like in the
+    CLI and the service. Profiles without a query are skipped, and invalid
+    profiles get a record with an ``error`` instead of stopping the run.
+
+    Args:
+        profiles (Iterable[dict]): Profiles with a ``query`` field.
+        output_path (str): Destination JSON Lines file.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+        backend: Search backend from ``get_search_backend``.
+        batch_size (int): Number of users encoded and searched together.
+        limit (int): Number of meals retrieved per user.
+        concurrency (int): Maximum number of simultaneous LLM generations.
+
+    Returns:
+        dict: Number of users processed and number of users that failed, either
+        because of an invalid profile or a failed generation.
+    """
+    stats = {"processed": 0, "failed": 0}
+    get_lm_studio_session(concurrency)
+
+    with open(output_path, "w", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+
+        def write_record(record):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            stats["processed"] += 1
+            stats["failed"] += "error" in record
+
+        def write_completed(max_pending):
+            # Write finished generations while at most max_pending remain queued
+            nonlocal pending
+            while len(pending) > max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write_record(future.result())
+
+        for batch in batched((profile for profile in profiles if profile.get("query")), batch_size):
+            valid = []
+            for profile in batch:
+                error = profile_error(profile)
+                if error is not None:
+                    write_record(dict(_record(profile), error=error))
+                    continue
+                profile.setdefault("dietary_restrictions", None)
+                profile.setdefault("dietary_preferences", None)
+                plan_request = parse_plan_request(profile["query"])
+                if plan_request:
+                    write_completed(batch_size)
+                    pending.add(pool.submit(_recommend_plan, profile, encoder, backend, plan_request, limit))
+                else:
+                    valid.append(profile)
+            batch = valid
+            if not batch:
+                continue
+
+            # Users sharing a query are normalized once, and the constraints come from the same pass
+            normalized = get_query_normalizer().normalize_batch(profile["query"] for profile in batch)
+            user_infos = [
+                query.text + str(profile_query_data(profile)) for profile, query in zip(batch, normalized)
+            ]
+            constraints = [list(query.constraints) for query in normalized]
+
+            query_vectors = encoder.encode(user_infos, batch_size=batch_size)
+            results = backend.search_batch(
+                query_vectors, limit=limit, constraints=constraints,
+                query_texts=[profile["query"] for profile in batch],
+            )
+
+            # The next batch is encoded and searched while these generations run
+            write_completed(batch_size)
+            pending.update(
+                pool.submit(_recommend, profile, user_info, hits)
+                for profile, user_info, hits in zip(batch, user_infos, results)
+            )
+
+        write_completed(0)
+
+    return stats
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate meal recommendations for many users at once.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--profiles", help="JSON Lines file with one profile (and optional query) per line")
+    source.add_argument("--mongo", action="store_true", help="Read profiles from Food_recommendation.user_profile")
+    parser.add_argument("--query", help="Query for profiles without their own 'query' field")
+    parser.add_argument("--output", default="recommendations.jsonl")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-users", type=int, help="Stop after this many profiles")
+    args = parser.parse_args()
+
+    if args.mongo:
+        profiles = iter_mongo_profiles(query=args.query)
+    else:
+        profiles = iter_jsonl_profiles(args.profiles, query=args.query)
+    if args.max_users:
+        profiles = islice(profiles, args.max_users)
+
+    stats = run_batch(
+        profiles,
+        args.output,
+        get_encoder("all-MiniLM-L6-v2"),
+        get_search_backend(),
+        batch_size=args.batch_size,
+        limit=args.limit,
+        concurrency=args.concurrency,
+    )
+    print(f"Processed {stats['processed']} users ({stats['failed']} failed), results in {args.output}")
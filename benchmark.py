@@ -0,0 +1,588 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+
+import numpy as np
+
+from lexical_index import BM25Index, tokenize
+from meal_ingestion import build_meal_description
+from meal_loader import batched, iter_restaurants
+from nutrients import NUTRIENT_FIELDS, extract_nutrient_constraints
+
+
+CATALOGUE_PATH = "Food_recommendation.meal_collection.json"
+
+DEFAULT_SIZES = (300, 10_000, 100_000, 1_000_000)
+
+# Queries in the style users type, combined with the synthetic profiles below
+BENCHMARK_QUERIES = (
+    "Suggest me full day meals",
+    "0 saturated fat meals",
+    "high protein breakfast under 500 calories",
+    "low sugar dinner",
+    "burger with less than 20g fat",
+    "Suggest a 3 meal plan for 7 days",
+    "vegetarian lunch",
+    "chicken meals over 30g protein",
+    "something sweet under 300 calories",
+    "low carb snacks",
+)
+
+BENCHMARK_PROFILES = (
+    {"weight_kg": 85, "height_cm": 160, "dietary_restrictions": "cholesterol", "dietary_preferences": None},
+    {"weight_kg": 60, "height_cm": 170, "dietary_restrictions": None, "dietary_preferences": "vegetarian"},
+    {"weight_kg": 95, "height_cm": 185, "dietary_restrictions": "diabetes", "dietary_preferences": "high protein"},
+    {"weight_kg": 70, "height_cm": 175, "dietary_restrictions": "lactose intolerance", "dietary_preferences": "spicy"},
+)
+
+# Raw catalogue units of each nutrient, used to render synthetic values
+RAW_NUTRIENT_FORMATS = {
+    "calories": ("calories", "{:.0f}"),
+    "total_fat": ("total fat", "{:.0f}% Daily Value"),
+    "saturated_fat": ("saturated fat", "{:.0f}g grams"),
+    "cholesterol": ("cholesterol", "{:.0f}mg milligrams"),
+    "total_carb": ("total carb", "{:.0f}g grams"),
+    "dietary_fibre": ("dietary fibre", "{:.0f}g grams"),
+    "sugar": ("sugar", "{:.0f}g grams"),
+    "protein": ("protein", "{:.0f}g grams"),
+}
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for the sentence encoder that needs no model download.
+
+    Tokens are hashed into signed buckets of a fixed-size vector, which is
+    then normalized, so texts sharing words get similar vectors. It measures
+    everything around the encoder, not the quality of the embeddings.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = zlib.crc32(token.encode("utf-8"))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        return vectors[0] if single else vectors
+
+
+def get_benchmark_encoder(name):
+    """
+    Returns the encoder used by a benchmark run.
+
+    Args:
+        name (str): "hashing" for the offline stand-in, or a SentenceTransformer model name.
+
+    Returns:
+        Encoder exposing ``encode`` and ``get_sentence_embedding_dimension``.
+    """
+    if name == "hashing":
+        return HashingEncoder()
+
+    from embedding_cache import get_encoder
+
+    return get_encoder(name)
+
+
+def synthetic_catalogue(size, seed=0, source=CATALOGUE_PATH, products_per_restaurant=100):
+    """
+    Generates a catalogue of ``size`` products shaped like the real export.
+
+    Each product copies the name of a real product with a numbered variant
+    and jitters its nutrient values by up to 30%, keeping the raw string
+    formats so parsing is exercised as in production.
+
+    Args:
+        size (int): Number of products.
+        seed (int): Random seed; the same seed always gives the same catalogue.
+        source (str): Real catalogue used as templates.
+        products_per_restaurant (int): Products per synthetic restaurant.
+
+    Yields:
+        dict: Restaurants with ``restaurant_name`` and ``products``.
+    """
+    from nutrients import parse_nutrients
+
+    templates = [
+        (restaurant["restaurant_name"], product["name"], parse_nutrients(product))
+        for restaurant in iter_restaurants(source)
+        for product in restaurant.get("products", [])
+    ]
+    rng = random.Random(seed)
+
+    for start in range(0, size, products_per_restaurant):
+        products = []
+        for index in range(start, min(start + products_per_restaurant, size)):
+            _, name, nutrients = templates[rng.randrange(len(templates))]
+            product = {"name": f"{name} #{index}"}
+            for field in NUTRIENT_FIELDS:
+                value = nutrients.get(field)
+                if value is not None:
+                    key, template = RAW_NUTRIENT_FORMATS[field]
+                    product[key] = template.format(value * rng.uniform(0.7, 1.3))
+            products.append(product)
+
+        restaurant_name = templates[(start // products_per_restaurant) % len(templates)][0]
+        yield {"restaurant_name": f"{restaurant_name} {start // products_per_restaurant}", "products": products}
+
+
+def build_local_index(directory, encoder, restaurants, batch_size=1024):
+    """
+    Encodes a catalogue into ``vector_database.index``, ``vector_database.catalogue``
+    and ``metadata.json`` files.
+
+    Args:
+        directory (str): Destination directory.
+        encoder: Sentence encoder.
+        restaurants (Iterable[dict]): Restaurants with their ``products``.
+        batch_size (int): Number of products encoded at once.
+
+    Returns:
+        tuple[str, str, int]: Index path, metadata path and number of products.
+    """
+    from meal_catalogue import CatalogueWriter
+    from search_backend import write_flat_index
+
+    index_path = os.path.join(directory, "vector_database.index")
+    metadata_path = os.path.join(directory, "metadata.json")
+    catalogue = CatalogueWriter()
+    products = (
+        (restaurant["restaurant_name"], product)
+        for restaurant in restaurants
+        for product in restaurant.get("products", [])
+    )
+
+    with open(metadata_path, "w", encoding="utf-8") as metadata:
+        metadata.write("[")
+        first = True
+
+        def vector_batches():
+            nonlocal first
+            for batch in batched(products, batch_size):
+                for restaurant_name, product in batch:
+                    row = {"restaurant_name": restaurant_name, "name": product["name"]}
+                    row.update({key.replace(" ", "_"): value for key, value in product.items() if key != "name"})
+                    metadata.write(("" if first else ", ") + json.dumps(row))
+                    catalogue.add(row)
+                    first = False
+                yield encoder.encode([build_meal_description(product) for _, product in batch], batch_size=batch_size)
+
+        count = write_flat_index(index_path, vector_batches(), encoder.get_sentence_embedding_dimension())
+        metadata.write("]")
+    catalogue.save(os.path.join(directory, "vector_database.catalogue"))
+
+    return index_path, metadata_path, count
+
+
+class _StubLMStudioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    tokens = ("Here ", "are ", "some ", "meals ", "that ", "fit ", "your ", "profile.")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        if body.get("stream"):
+            chunks = [
+                "data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n"
+                for token in self.tokens
+            ] + ["data: [DONE]\n\n"]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        data = json.dumps({"choices": [{"message": {"content": "".join(self.tokens)}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_lm_studio(delay=0.0):
+    """
+    Starts an OpenAI-compatible chat completions server standing in for LM Studio.
+
+    Args:
+        delay (float): Seconds each request waits before answering, to mimic generation time.
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: The running server and its chat completions URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLMStudioHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def latency_summary(seconds):
+    """
+    Summarizes latencies in milliseconds.
+
+    Args:
+        seconds (list[float]): Latency samples in seconds.
+
+    Returns:
+        dict: Mean and p50/p95/p99 in milliseconds.
+    """
+    samples = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(samples):
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"mean_ms": float(samples.mean()), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def exact_top_k(vectors, queries, k, chunk_size=16384):
+    """
+    Finds the exact cosine top-k rows for every query, scanning the vectors in chunks.
+
+    Args:
+        vectors (numpy.ndarray): Catalogue vectors, possibly memory-mapped.
+        queries (numpy.ndarray): Query vectors, one per row.
+        k (int): Number of neighbours.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: Row numbers and cosine scores of shape (queries, k), best first.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        norms = np.maximum(np.linalg.norm(chunk, axis=1), 1e-12)
+        scores = (queries @ chunk.T) / norms
+        rows = np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)
+
+        scores = np.hstack([best_scores, scores])
+        rows = np.hstack([best_rows, rows])
+        keep = min(k, scores.shape[1])
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(rows, top, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def recall_at_k(vectors, query, hit_rows, truth_scores, tolerance=1e-5):
+    """
+    Computes recall@k of one result list against exact search.
+
+    A hit counts when its exact score reaches the k-th exact score, so ties
+    at the cut-off are not counted as misses.
+
+    Args:
+        vectors (numpy.ndarray): Catalogue vectors.
+        query (numpy.ndarray): Query vector.
+        hit_rows (list[int]): Rows returned by the backend.
+        truth_scores (numpy.ndarray): Exact top-k scores, best first.
+        tolerance (float): Allowed float32 rounding difference.
+
+    Returns:
+        float: Fraction of the k exact neighbours that were found.
+    """
+    if not len(truth_scores):
+        return 1.0
+    hits = np.asarray(vectors[np.sort(hit_rows)], dtype=np.float32) if hit_rows else np.empty((0, len(query)))
+    scores = (hits @ query) / (np.maximum(np.linalg.norm(hits, axis=1), 1e-12) * max(np.linalg.norm(query), 1e-12))
+    return min(int((scores >= truth_scores[-1] - tolerance).sum()), len(truth_scores)) / len(truth_scores)
+
+
+def benchmark_queries(count, seed=0):
+    """
+    Builds a reproducible list of (profile, query) pairs.
+    """
+    rng = random.Random(seed)
+    return [(rng.choice(BENCHMARK_PROFILES), rng.choice(BENCHMARK_QUERIES)) for _ in range(count)]
+
+
+def run_size(size, backend_name="local", encoder_name="hashing", query_count=200, k=10, quantization=None,
+             oversampling=4.0, hybrid=False, end_to_end_users=50, llm_delay=0.0, seed=0, workdir=None):
+    """
+    Benchmarks ingestion, retrieval and end-to-end recommendation at one catalogue size.
+
+    Queries are encoded from the raw query text and profile, without the
+    NLTK query optimization, so retrieval numbers do not depend on it. The
+    end-to-end phase runs ``batch_recommend.run_batch`` against a stub LM
+    Studio server and does use it.
+
+    Args:
+        size (int): Number of synthetic products.
+        backend_name (str): "local" or "qdrant" (in-memory client).
+        encoder_name (str): "hashing" or a SentenceTransformer model name.
+        query_count (int): Number of timed queries.
+        k (int): Results per query, also used for recall@k.
+        quantization (str): Quantization of the local index, "int8" or "binary".
+        oversampling (float): Rescoring oversampling factor for quantized search.
+        hybrid (bool): Whether to fuse BM25 into the results.
+        end_to_end_users (int): Number of users in the end-to-end phase; 0 skips it.
+        llm_delay (float): Seconds the stub LLM waits per request.
+        seed (int): Seed of the synthetic catalogue and queries.
+        workdir (str): Directory for the index files; a temporary one by default.
+
+    Returns:
+        dict: Measurements of every phase.
+    """
+    from search_backend import HybridSearchBackend, LocalIndexBackend, QdrantBackend
+
+    encoder = get_benchmark_encoder(encoder_name)
+    result = {"size": size}
+
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        # Ingestion: encode every product and store it in the backend
+        started = time.perf_counter()
+        if backend_name == "qdrant":
+            from qdrant_client import QdrantClient
+
+            from meal_ingestion import sync_meals
+
+            client = QdrantClient(":memory:")
+            lexical = BM25Index()
+            # The version stamp stays in the scratch directory so running services keep their caches
+            stats = sync_meals(
+                client, encoder, synthetic_catalogue(size, seed), batch_size=1024, lexical_index=lexical,
+                version_path=os.path.join(directory, ".catalogue_version"),
+            )
+            products = stats["upserted"]
+            backend = QdrantBackend(client=client, oversampling=oversampling if quantization else None)
+        else:
+            lexical = None
+            index_path, metadata_path, products = build_local_index(directory, encoder, synthetic_catalogue(size, seed))
+            backend = LocalIndexBackend(index_path, metadata_path, quantization=quantization, oversampling=oversampling)
+        elapsed = time.perf_counter() - started
+        result["ingestion"] = {
+            "products": products,
+            "seconds": elapsed,
+            "products_per_second": products / elapsed if elapsed else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        # Ground truth vectors for recall, with the row of every backend ID
+        if backend_name == "qdrant":
+            rows, vectors = {}, []
+            offset = None
+            while True:
+                points, offset = client.scroll("meals", limit=4096, offset=offset, with_vectors=True, with_payload=False)
+                for point in points:
+                    rows[str(point.id)] = len(vectors)
+                    vectors.append(point.vector)
+                if offset is None:
+                    break
+            vectors = np.asarray(vectors, dtype=np.float32)
+        else:
+            rows, vectors = None, backend.vectors
+
+        if hybrid:
+            backend = HybridSearchBackend(backend, lexical)
+
+        pairs = benchmark_queries(query_count, seed)
+        texts = [query + str(profile) for profile, query in pairs]
+
+        encode_times = []
+        query_vectors = []
+        for text in texts:
+            started = time.perf_counter()
+            query_vectors.append(encoder.encode(text))
+            encode_times.append(time.perf_counter() - started)
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        constraints = [extract_nutrient_constraints(query) for _, query in pairs]
+
+        # Latency of single searches, with the nutrient pre-filters the queries ask for
+        search_times = []
+        for vector, query_constraints, (_, query) in zip(query_vectors, constraints, pairs):
+            started = time.perf_counter()
+            backend.search(vector, limit=k, constraints=query_constraints, query_text=query)
+            search_times.append(time.perf_counter() - started)
+        result["encode_latency"] = latency_summary(encode_times)
+        result["query_latency"] = latency_summary(search_times)
+
+        # Throughput of one batched search over all queries
+        started = time.perf_counter()
+        backend.search_batch(query_vectors, limit=k, constraints=constraints, query_texts=[query for _, query in pairs])
+        elapsed = time.perf_counter() - started
+        result["batch_search"] = {"queries": len(pairs), "seconds": elapsed, "queries_per_second": len(pairs) / elapsed}
+
+        # Recall@k of unfiltered searches against exact brute force
+        _, truth_scores = exact_top_k(vectors, query_vectors, k)
+        recalls = []
+        for vector, query_truth, (_, query) in zip(query_vectors, truth_scores, pairs):
+            hits = backend.search(vector, limit=k, query_text=query)
+            hit_rows = [rows[str(hit.id)] if rows is not None else int(hit.id) for hit in hits]
+            recalls.append(recall_at_k(vectors, vector, hit_rows, query_truth))
+        result[f"recall_at_{k}"] = float(np.mean(recalls))
+
+        if end_to_end_users:
+            result["end_to_end"] = run_end_to_end(encoder, backend, end_to_end_users, k, llm_delay, seed, directory)
+
+        result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_end_to_end(encoder, backend, users, limit, llm_delay, seed, directory):
+    """
+    Times ``batch_recommend.run_batch`` for synthetic users against a stub LM Studio.
+
+    The phase is skipped, instead of failing the whole benchmark, when the
+    NLTK stop word list used by the query normalizer is not installed.
+    """
+    import recommend_meal
+    from batch_recommend import run_batch
+    from query_normalizer import load_stop_words
+
+    try:
+        load_stop_words()
+    except LookupError:
+        reason = "NLTK stop words are not installed; run nltk.download('stopwords') to include this phase"
+        print(f"Skipping the end-to-end phase: {reason}", flush=True)
+        return {"skipped": reason}
+
+    server, url = start_stub_lm_studio(llm_delay)
+    default_url, recommend_meal.LM_STUDIO_URL = recommend_meal.LM_STUDIO_URL, url
+    try:
+        profiles = [dict(profile, query=query) for profile, query in benchmark_queries(users, seed + 1)]
+        started = time.perf_counter()
+        stats = run_batch(profiles, os.path.join(directory, "recommendations.jsonl"), encoder, backend, limit=limit)
+        elapsed = time.perf_counter() - started
+    finally:
+        recommend_meal.LM_STUDIO_URL = default_url
+        server.shutdown()
+
+    return {
+        "users": stats["processed"],
+        "failed": stats["failed"],
+        "seconds": elapsed,
+        "users_per_second": stats["processed"] / elapsed if elapsed else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, isolate=True, **options):
+    """
+    Runs ``run_size`` for every catalogue size.
+
+    Args:
+        sizes (Iterable[int]): Catalogue sizes, smallest first.
+        isolate (bool): Run every size in a fresh process so its peak memory is its own.
+        **options: Arguments passed to ``run_size``.
+
+    Returns:
+        dict: Environment details and one result per size.
+    """
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "options": options,
+        "results": [],
+    }
+    for size in sizes:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(run_size, size, **options).result()
+        else:
+            result = run_size(size, **options)
+        report["results"].append(result)
+        print(
+            f"{size:>9} products: ingest {result['ingestion']['products_per_second']:.0f}/s, "
+            f"query p50 {result['query_latency']['p50_ms']:.2f} ms p99 {result['query_latency']['p99_ms']:.2f} ms, "
+            f"batch {result['batch_search']['queries_per_second']:.0f} q/s, "
+            f"recall@{options.get('k', 10)} {result['recall_at_' + str(options.get('k', 10))]:.3f}, "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB",
+            flush=True,
+        )
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and recommendation offline.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated synthetic catalogue sizes")
+    parser.add_argument("--backend", choices=["local", "qdrant"], default="local")
+    parser.add_argument("--encoder", default="hashing",
+                        help="'hashing' for the offline stand-in or a SentenceTransformer model name")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--quantization", choices=["int8", "binary"])
+    parser.add_argument("--oversampling", type=float, default=4.0)
+    parser.add_argument("--hybrid", action="store_true")
+    parser.add_argument("--users", type=int, default=50, help="Users in the end-to-end phase, 0 to skip it")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="Seconds the stub LLM waits per request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for temporary index files")
+    parser.add_argument("--no-isolate", action="store_true", help="Run all sizes in this process")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        [int(size) for size in args.sizes.split(",")],
+        isolate=not args.no_isolate,
+        backend_name=args.backend,
+        encoder_name=args.encoder,
+        query_count=args.queries,
+        k=args.k,
+        quantization=args.quantization,
+        oversampling=args.oversampling,
+        hybrid=args.hybrid,
+        end_to_end_users=args.users,
+        llm_delay=args.llm_delay,
+        seed=args.seed,
+        workdir=args.workdir,
+    )
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
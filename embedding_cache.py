@@ -0,0 +1,284 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked across processes
+    fcntl = None
+
+
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", ".embedding_cache")
+
+# ``encode`` arguments that do not change the returned vectors, so they are left out of the cache key
+ENCODE_IGNORED_OPTIONS = frozenset({"show_progress_bar", "device", "convert_to_numpy", "convert_to_tensor"})
+
+# ``encode`` arguments whose output is not a fixed-size float32 row, which the cache cannot store
+ENCODE_UNSUPPORTED_OPTIONS = {"output_value": "sentence_embedding", "precision": "float32", "truncate_dim": None}
+
+
+def embedding_key(model_name, text, options=""):
+    """
+    Builds the content address of an embedding.
+
+    Args:
+        model_name (str): Name of the encoder model.
+        text (str): Text that is encoded.
+        options (str): Encode options that change the vector, see ``encode_options``.
+
+    Returns:
+        str: Hex digest identifying the (model, options, text) triple.
+    """
+    if options:
+        model_name = f"{model_name}\0{options}"
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def encode_options(kwargs):
+    """
+    Describes the ``encode`` arguments that change the returned vectors.
+
+    Args:
+        kwargs (dict): Keyword arguments passed to ``encode``.
+
+    Returns:
+        str: Canonical form of the output-affecting arguments; empty for the defaults.
+    """
+    for name, default in ENCODE_UNSUPPORTED_OPTIONS.items():
+        if kwargs.get(name, default) != default:
+            raise ValueError(f"CachedEncoder.encode does not support {name}={kwargs[name]!r}.")
+    options = {
+        name: value for name, value in kwargs.items()
+        if name not in ENCODE_IGNORED_OPTIONS and name not in ENCODE_UNSUPPORTED_OPTIONS
+    }
+    if not options.get("normalize_embeddings", True):
+        del options["normalize_embeddings"]  # False is the default
+    return repr(sorted(options.items())) if options else ""
+
+
+class EmbeddingCache:
+    """
+    Disk-backed float32 embedding store with an in-memory LRU front.
+
+    Vectors are appended to ``vectors.f32`` and read back through a read-only
+    memory map, so the same cache directory can be shared by several runs and
+    processes. ``keys.tsv`` maps each content key to its row in the vector file.
+    """
+
+    def __init__(self, model_name, cache_dir=DEFAULT_CACHE_DIR, memory_size=10000):
+        safe_name = model_name.replace("/", "__")
+        self.model_name = model_name
+        self.directory = os.path.join(cache_dir, safe_name)
+        self.memory_size = memory_size
+
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._keys_path = os.path.join(self.directory, "keys.tsv")
+        self._meta_path = os.path.join(self.directory, "dimension")
+        self._lock_path = os.path.join(self.directory, ".lock")
+
+        self._rows = {}
+        self._keys_offset = 0
+        self._memory = OrderedDict()
+        self._mmap = None
+        self.dimension = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as file:
+                self.dimension = int(file.read().strip())
+        self._refresh_keys()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _refresh_keys(self):
+        # Pick up rows appended by other processes since the last read
+        if not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "r") as file:
+            file.seek(self._keys_offset)
+            for line in file:
+                if not line.endswith("\n"):
+                    break  # Partially written line; retry on the next refresh
+                key, row = line.rstrip("\n").split("\t")
+                self._rows[key] = int(row)
+                self._keys_offset += len(line.encode("utf-8"))
+
+    def _vector_at(self, row):
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            rows = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension)
+            )
+        return np.array(self._mmap[row])
+
+    def _remember(self, key, vector):
+        # Shared by every later lookup, so callers must not be able to modify it in place
+        vector = vector.view()
+        vector.flags.writeable = False
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text, options=""):
+        """
+        Looks up the cached embedding for a text.
+
+        Args:
+            text (str): Text that was encoded.
+            options (str): Encode options the embedding was computed with.
+
+        Returns:
+            numpy.ndarray | None: The embedding as a read-only array, or None on a cache miss.
+        """
+        key = embedding_key(self.model_name, text, options)
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            return vector
+
+        row = self._rows.get(key)
+        if row is None:
+            self._refresh_keys()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+
+        vector = self._vector_at(row)
+        self._remember(key, vector)
+        return self._memory[key]
+
+    def put_many(self, texts, vectors, options=""):
+        """
+        Appends embeddings to the disk cache.
+
+        Args:
+            texts (list[str]): Texts that were encoded.
+            vectors (numpy.ndarray): Matching embeddings, one row per text.
+            options (str): Encode options the embeddings were computed with.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            with open(self._meta_path, "w") as file:
+                file.write(str(self.dimension))
+
+        with open(self._lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh_keys()
+                first_row = os.path.getsize(self._vectors_path) // (4 * self.dimension) \
+                    if os.path.exists(self._vectors_path) else 0
+
+                # Vectors are written before keys so every listed key has its data
+                with open(self._vectors_path, "ab") as file:
+                    file.write(vectors.tobytes())
+                lines = []
+                for offset, text in enumerate(texts):
+                    key = embedding_key(self.model_name, text, options)
+                    lines.append(f"{key}\t{first_row + offset}\n")
+                with open(self._keys_path, "a") as file:
+                    file.writelines(lines)
+                self._refresh_keys()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+        for text, vector in zip(texts, vectors):
+            self._remember(embedding_key(self.model_name, text, options), vector)
+
+
+class CachedEncoder:
+    """
+    Drop-in replacement for ``SentenceTransformer`` that encodes each
+    (model, text) pair at most once across runs. Encode arguments that change
+    the vectors, such as ``normalize_embeddings``, are part of the cache key.
+
+    The model itself is only loaded on the first cache miss. An ONNX artifact
+    written by ``encoder_artifact.py`` is preferred over the
+    ``SentenceTransformer``, which needs torch and takes seconds to load.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, cache_dir=DEFAULT_CACHE_DIR, memory_size=10000):
+        self.model_name = model_name
+        self.cache = EmbeddingCache(model_name, cache_dir=cache_dir, memory_size=memory_size)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            # Timed here so the load shows up in the stage it delays, and only when it happens
+            with span("model_load", model=self.model_name):
+                from encoder_artifact import load_encoder_artifact
+
+                self._model = load_encoder_artifact(self.model_name)
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def get_sentence_embedding_dimension(self):
+        if self.cache.dimension is not None:
+            return self.cache.dimension
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Encodes one text or a list of texts, reusing cached embeddings.
+
+        Args:
+            sentences (str | list[str]): Text(s) to encode.
+            batch_size (int): Batch size used for the cache misses.
+            **kwargs: Other ``SentenceTransformer.encode`` arguments; those that
+                change the vectors select a separate set of cached embeddings.
+
+        Returns:
+            numpy.ndarray: A 1-D vector for a single text, otherwise one row per text.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        options = encode_options(kwargs)
+
+        # Serialize access so the encoder can be shared by service worker threads
+        with self._lock:
+            vectors = [self.cache.get(text, options) for text in texts]
+            missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+            if missing:
+                kwargs.pop("convert_to_tensor", None)
+                kwargs.pop("convert_to_numpy", None)
+                encoded = self.model.encode(missing, batch_size=batch_size, convert_to_numpy=True, **kwargs)
+                self.cache.put_many(missing, encoded, options)
+                fresh = dict(zip(missing, encoded))
+                vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+        if single:
+            # A copy, so normalizing or editing the result never changes the cached vector
+            return np.array(vectors[0], dtype=np.float32)
+        if not vectors:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name=DEFAULT_MODEL_NAME):
+    """
+    Returns the process-wide cached encoder for a model.
+
+    Args:
+        model_name (str): Sentence-transformers model name.
+
+    Returns:
+        CachedEncoder: Shared encoder instance.
+    """
+    return CachedEncoder(model_name)
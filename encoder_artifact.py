@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+DEFAULT_ARTIFACT_DIR = os.environ.get("ENCODER_ARTIFACT_DIR", ".encoder_artifacts")
+
+ARTIFACT_MODEL = "model.onnx"
+ARTIFACT_WEIGHTS = "model.onnx.data"
+ARTIFACT_TOKENIZER = "tokenizer.json"
+ARTIFACT_CONFIG = "encoder.json"
+
+
+def artifact_directory(model_name, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Returns the directory holding the exported artifact of a model.
+
+    Args:
+        model_name (str): Sentence-transformers model name.
+        artifact_dir (str): Root directory of the exported artifacts.
+
+    Returns:
+        str: Directory path.
+    """
+    return os.path.join(artifact_dir, model_name.replace("/", "__"))
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported transformer with onnxruntime.
+
+    It reproduces the sentence-transformers pipeline (tokenize, transformer,
+    mean pooling, optional normalization) without importing torch, so it is
+    ready in a fraction of a second. The weights are stored as external data
+    next to the graph, which onnxruntime memory-maps instead of copying into
+    each process.
+    """
+
+    def __init__(self, directory, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, ARTIFACT_CONFIG), "r") as file:
+            self.config = json.load(file)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, ARTIFACT_TOKENIZER))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        threads = threads or int(os.environ.get("ENCODER_THREADS", 0))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, ARTIFACT_MODEL), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+
+        (token_embeddings,) = self.session.run(["last_hidden_state"], inputs)
+
+        # Mean pooling over the non-padding tokens, as in the sentence-transformers Pooling module
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **kwargs):
+        """
+        Encodes one text or a list of texts.
+
+        Args:
+            sentences (str | list[str]): Text(s) to encode.
+            batch_size (int): Number of texts run through the model at once.
+            normalize_embeddings (bool): Whether to L2-normalize even if the model does not.
+            **kwargs: Other ``SentenceTransformer.encode`` arguments, which are ignored.
+
+        Returns:
+            numpy.ndarray: A 1-D vector for a single text, otherwise one row per text.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        vectors = np.vstack([
+            self._encode_batch(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)
+        ]).astype(np.float32, copy=False)
+        if self.config["normalize"] or normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+def load_encoder_artifact(model_name, artifact_dir=DEFAULT_ARTIFACT_DIR):
+    """
+    Loads the exported encoder of a model if it exists and its runtime is installed.
+
+    Args:
+        model_name (str): Sentence-transformers model name.
+        artifact_dir (str): Root directory of the exported artifacts.
+
+    Returns:
+        OnnxEncoder | None: The encoder, or None to fall back to ``SentenceTransformer``.
+    """
+    directory = artifact_directory(model_name, artifact_dir)
+    if not all(os.path.exists(os.path.join(directory, name)) for name in (ARTIFACT_MODEL, ARTIFACT_TOKENIZER, ARTIFACT_CONFIG)):
+        return None
+    try:
+        return OnnxEncoder(directory)
+    except ImportError:
+        return None
+
+
+def export_encoder_artifact(model_name, artifact_dir=DEFAULT_ARTIFACT_DIR, opset=17, tolerance=1e-4):
+    """
+    Exports a sentence-transformers model to ONNX next to its tokenizer.
+
+    The exported encoder is checked against the original on a few sentences
+    before this returns.
+
+    Args:
+        model_name (str): Sentence-transformers model name.
+        artifact_dir (str): Root directory of the exported artifacts.
+        opset (int): ONNX opset version.
+        tolerance (float): Maximum allowed absolute difference between the two encoders.
+
+    Returns:
+        str: Directory of the artifact.
+    """
+    import onnx
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    directory = artifact_directory(model_name, artifact_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    sample = transformer.tokenizer(["Grilled chicken salad"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    model_path = os.path.join(directory, ARTIFACT_MODEL)
+
+    auto_model = transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=opset,
+        )
+
+    # Move the weights out of the graph so onnxruntime can memory-map them
+    graph = onnx.load(model_path)
+    weights_path = os.path.join(directory, ARTIFACT_WEIGHTS)
+    if os.path.exists(weights_path):
+        os.remove(weights_path)  # onnx appends to an existing external data file
+    onnx.save_model(graph, model_path, save_as_external_data=True, all_tensors_to_one_file=True, location=ARTIFACT_WEIGHTS)
+
+    transformer.tokenizer.backend_tokenizer.save(os.path.join(directory, ARTIFACT_TOKENIZER))
+    with open(os.path.join(directory, ARTIFACT_CONFIG), "w") as file:
+        json.dump({
+            "model_name": model_name,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "pad_token": transformer.tokenizer.pad_token,
+            "pad_token_id": transformer.tokenizer.pad_token_id,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+        }, file, indent=2)
+
+    sentences = ["Grilled chicken salad", "Suggest me full day meals with less than 20g fat", ""]
+    difference = np.abs(OnnxEncoder(directory).encode(sentences) - model.encode(sentences)).max()
+    if difference > tolerance:
+        raise ValueError(f"Exported encoder differs from {model_name} by {difference:.2e}")
+    return directory
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Export the sentence encoder to ONNX for fast startup.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--output", default=DEFAULT_ARTIFACT_DIR, help="Root directory of the artifacts")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    print(f"Encoder exported to {export_encoder_artifact(args.model, args.output, args.opset)}")
@@ -0,0 +1,136 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+
+# Encoder of the current worker process, loaded once by the pool initializer
+_worker_encoder = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_encoder
+
+    # Split the cores between workers instead of every worker using all of them
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "ENCODER_THREADS"):
+        os.environ[variable] = str(threads)
+
+    from embedding_cache import get_encoder
+
+    _worker_encoder = get_encoder(model_name)
+    _worker_encoder.model  # Load the weights before the first batch arrives
+
+
+def _encode_in_worker(texts, batch_size):
+    return np.asarray(_worker_encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def _dimension_in_worker():
+    return _worker_encoder.get_sentence_embedding_dimension()
+
+
+class EncodingPool:
+    """
+    Process pool in which every worker holds one loaded sentence encoder.
+
+    Batches are spread over the workers and their vectors are returned in
+    submission order. Each worker uses ``cpu_count / workers`` threads so the
+    pool as a whole uses every core without oversubscribing them. Workers
+    share the on-disk embedding cache, so texts encoded before are not
+    encoded again.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", workers=None, max_pending=None):
+        self.model_name = model_name
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        # Spawned workers do not inherit the parent's threads or loaded libraries
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads),
+        )
+        self._dimension = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def get_sentence_embedding_dimension(self):
+        if self._dimension is None:
+            self._dimension = self._pool.submit(_dimension_in_worker).result()
+        return self._dimension
+
+    def imap(self, batches, texts, batch_size=32):
+        """
+        Encodes batches on the workers, keeping at most ``max_pending`` in flight.
+
+        Args:
+            batches (Iterable): Batches of any kind, read lazily.
+            texts (Callable): Returns the list of texts to encode for a batch.
+            batch_size (int): Batch size used by each worker's encoder.
+
+        Yields:
+            tuple: Each batch with its vectors, in the order the batches were read.
+        """
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, self._pool.submit(_encode_in_worker, texts(batch), batch_size)))
+            if len(pending) >= self.max_pending:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Encodes one text or a list of texts across the workers.
+
+        Args:
+            sentences (str | list[str]): Text(s) to encode.
+            batch_size (int): Batch size used by each worker's encoder.
+
+        Returns:
+            numpy.ndarray: A 1-D vector for a single text, otherwise one row per text.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # One shard per worker, but no smaller than one encoder batch
+        shard_size = max(batch_size, -(-len(texts) // self.workers))
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+        vectors = np.vstack([shard_vectors for _, shard_vectors in self.imap(shards, list, batch_size)])
+        return vectors[0] if single else vectors
+
+
+def encode_batches(encoder, batches, texts, batch_size=32):
+    """
+    Encodes batches in order with a plain encoder or an ``EncodingPool``.
+
+    Args:
+        encoder: Sentence encoder, or an ``EncodingPool`` to encode on several processes.
+        batches (Iterable): Batches of any kind, read lazily.
+        texts (Callable): Returns the list of texts to encode for a batch.
+        batch_size (int): Encoder batch size.
+
+    Yields:
+        tuple: Each batch with its vectors.
+    """
+    if isinstance(encoder, EncodingPool):
+        yield from encoder.imap(batches, texts, batch_size)
+        return
+    for batch in batches:
+        yield batch, encoder.encode(texts(batch), batch_size=batch_size)
@@ -0,0 +1,156 @@
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase alphanumeric tokens.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        list[str]: Tokens in order.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index over meal and restaurant names scored with BM25.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = defaultdict(list)
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, doc_id, text):
+        """
+        Indexes a document. Documents whose ID is already indexed are skipped.
+
+        Args:
+            doc_id (int | str): Identifier returned by ``search``, e.g. the point ID.
+            text (str): Text to index, e.g. the product and restaurant names.
+        """
+        if doc_id in self._positions:
+            return
+
+        position = len(self.doc_ids)
+        tokens = tokenize(text)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self._positions[doc_id] = position
+        for term, frequency in Counter(tokens).items():
+            self.postings[term].append((position, frequency))
+
+    def search(self, query, limit=10):
+        """
+        Ranks documents by their BM25 score for a query.
+
+        Args:
+            query (str): Free-text query.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list[tuple]: Document IDs and scores, best first.
+        """
+        document_count = len(self.doc_ids)
+        if not document_count:
+            return []
+        average_length = sum(self.doc_lengths) / document_count
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            entries = self.postings.get(term)
+            if not entries:
+                continue
+            idf = math.log(1 + (document_count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for position, frequency in entries:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[position] / average_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[position], score) for position, score in best]
+
+    def save(self, path):
+        """
+        Writes the index to a JSON file.
+
+        Args:
+            path (str): Destination file.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "doc_ids": self.doc_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings,
+            }, file)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by ``save``.
+
+        Args:
+            path (str): Index file.
+
+        Returns:
+            BM25Index: The loaded index.
+        """
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.doc_ids = data["doc_ids"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings = defaultdict(list, {
+            term: [tuple(entry) for entry in entries] for term, entries in data["postings"].items()
+        })
+        index._positions = {doc_id: position for position, doc_id in enumerate(index.doc_ids)}
+        return index
+
+
+def meal_lexical_text(payload):
+    """
+    Builds the text indexed for a meal.
+
+    Args:
+        payload (dict): Meal payload with ``name`` and ``restaurant_name``.
+
+    Returns:
+        str: Product and restaurant names.
+    """
+    return f"{payload.get('name', '')} {payload.get('restaurant_name', '')}"
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several rankings with reciprocal rank fusion.
+
+    Args:
+        rankings (list[list]): Ranked lists of document IDs, best first.
+        k (int): Damping constant; larger values flatten the rank contribution.
+
+    Returns:
+        list[tuple]: Document IDs and fused scores, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,25 +1,214 @@
-from user_profile import get_user_profile,add_dictionary_to_mongo,vector_db_user_profile
-from recommend_meal import get_query_from_lm_studio,optimize_meal_query
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
+import asyncio
+
+from user_profile import get_user_profile,add_dictionary_to_mongo,vector_db_user_profile,get_profile_repository
+from recommend_meal import get_query_from_lm_studio,stream_query_from_lm_studio
+from embedding_cache import get_encoder
+from search_backend import get_search_backend
+from query_normalizer import get_query_normalizer
+from prompt_builder import build_meal_context
+from meal_planner import parse_plan_request
+from plan_fanout import recommend_plan, recommend_plan_async
+from tracing import span, start_profiler_from_env, tracer
+
+
+def profile_query_data(user_profile):
+    """
+    Keeps the profile fields that are relevant for meal recommendations.
+
+    Args:
+        user_profile (dict): Full user profile.
+
+    Returns:
+        dict: Weight, height, dietary restrictions and preferences.
+    """
+    return {
+        'weight_kg': user_profile['weight_kg'],
+        'height_cm': user_profile['height_cm'],
+        'dietary_restrictions': user_profile['dietary_restrictions'],
+        'dietary_preferences': user_profile['dietary_preferences']
+    }
+
 
+def encode_user_query(user_data, user_query, encoder):
+    """
+    Builds and encodes the search query for a user.
+
+    Args:
+        user_data (dict): Output of ``profile_query_data``.
+        user_query (str): Meal suggestion query typed by the user.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+
+    Returns:
+        tuple: The query sent to the LLM, its embedding as a list and the
+        nutrient constraints found while normalizing the query.
+    """
+    with span("optimize_query"):
+        normalized = get_query_normalizer().normalize(user_query)
+    user_info = normalized.text + str(user_data)
+    with span("encode"):
+        return user_info, encoder.encode(user_info).tolist(), list(normalized.constraints)
+
+
+def retrieve_meals(user_data, user_query, encoder, backend, limit=20, encoded_query=None):
+    """
+    Retrieves the meals used as LLM context for one query.
+
+    Meal plan requests are searched per slot by ``plan_fanout.recommend_plan`` instead.
+
+    Args:
+        user_data (dict): Output of ``profile_query_data``.
+        user_query (str): Meal suggestion query typed by the user.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+        backend: Search backend from ``get_search_backend``.
+        limit (int): Number of meals retrieved.
+        encoded_query (tuple): Output of ``encode_user_query`` if it was already computed.
+
+    Returns:
+        tuple: The query sent to the LLM, the meals context string and the hits.
+    """
+    # Numeric constraints such as "under 500 calories" are applied as a pre-filter
+    user_info, query_vector, constraints = encoded_query or encode_user_query(user_data, user_query, encoder)
+
+    # Search the configured backend (Qdrant or the local index)
+    with span("search", backend=type(backend).__name__, constraints=len(constraints)):
+        hits = backend.search(query_vector, limit=limit, constraints=constraints, query_text=user_query)
+
+    # Render the hits as a compact table that fits the prompt token budget
+    with span("build_context"):
+        meals = build_meal_context(hits)
+
+    return user_info, meals, hits
+
+
+def recommend_meals(user_data, user_query, encoder, backend, limit=20, cache=None):
+    """
+    Runs the recommendation pipeline for one query.
+
+    Meal plan requests are split into per-slot searches and LLM calls by
+    ``plan_fanout.recommend_plan``.
+
+    Args:
+        user_data (dict): Output of ``profile_query_data``.
+        user_query (str): Meal suggestion query typed by the user.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+        backend: Search backend from ``get_search_backend``.
+        limit (int): Number of meals retrieved as LLM context.
+        cache (SemanticResponseCache): Cache answering near-identical queries without search or LLM calls.
+
+    Returns:
+        dict: The LLM ``answer`` and the retrieved ``hits``.
+    """
+    encoded_query = encode_user_query(user_data, user_query, encoder)
+    constraints = encoded_query[2]
+    plan_request = parse_plan_request(user_query)
+
+    cached = _cached_recommendation(cache, encoded_query, user_data, plan_request)
+    if cached is not None:
+        return cached
+
+    if plan_request:
+        plan = recommend_plan(user_data, user_query, encoder, backend, plan_request, limit)
+        recommendation = {"answer": plan["answer"], "hits": plan["hits"]}
+    else:
+        user_info, meals, hits = retrieve_meals(
+            user_data, user_query, encoder, backend, limit, encoded_query=encoded_query
+        )
+        with span("llm"):
+            answer = get_query_from_lm_studio(user_info, meals)
+        recommendation = {"answer": answer, "hits": hits}
+
+    if cache is not None:
+        cache.put(encoded_query[1], user_data, recommendation, constraints, plan_request)
+    return recommendation
+
+
+def _cached_recommendation(cache, encoded_query, user_data, plan_request):
+    # Plans of different sizes can have near-identical queries, so the plan size is part of the key
+    if cache is None:
+        return None
+    with span("cache_lookup"):
+        cached = cache.get(encoded_query[1], user_data, encoded_query[2], plan_request)
+    tracer.increment("response_cache_total", result="miss" if cached is None else "hit")
+    return cached
+
+
+async def recommend_meals_async(user_data, user_query, encoder, backend, limit=20, cache=None):
+    """
+    Runs ``recommend_meals`` from a running event loop.
+
+    Meal plan requests fan out on the caller's loop, so asynchronous
+    clients such as ``QdrantBackend``'s stay on the loop that created them.
+    Other requests run ``recommend_meals`` on the default executor.
+
+    Args:
+        user_data (dict): Output of ``profile_query_data``.
+        user_query (str): Meal suggestion query typed by the user.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+        backend: Search backend from ``get_search_backend``.
+        limit (int): Number of meals retrieved as LLM context.
+        cache (SemanticResponseCache): Cache answering near-identical queries without search or LLM calls.
+
+    Returns:
+        dict: The LLM ``answer`` and the retrieved ``hits``.
+    """
+    loop = asyncio.get_running_loop()
+    plan_request = parse_plan_request(user_query)
+    if not plan_request:
+        return await loop.run_in_executor(None, recommend_meals, user_data, user_query, encoder, backend, limit, cache)
+
+    encoded_query = await loop.run_in_executor(None, encode_user_query, user_data, user_query, encoder)
+    cached = _cached_recommendation(cache, encoded_query, user_data, plan_request)
+    if cached is not None:
+        return cached
+
+    plan = await recommend_plan_async(user_data, user_query, encoder, backend, plan_request, limit)
+    recommendation = {"answer": plan["answer"], "hits": plan["hits"]}
+    if cache is not None:
+        cache.put(encoded_query[1], user_data, recommendation, encoded_query[2], plan_request)
+    return recommendation
 
 
 if __name__ == "__main__":
 
-    # Initialize the sentence transformer model
-    encoder = SentenceTransformer("all-MiniLM-L6-v2")
-    
-    # Sample dictionary to insert
-    user_profile = get_user_profile()
-
-    # Add dictionary to MongoDB
-    result = add_dictionary_to_mongo("Food_recommendation", "user_profile", user_profile)
-    
-    if result:
-        print("Successfull added")
-    else:
-        print("Operation failed")  # Optional: Handle the failure case
+    # Set MEAL_PROFILE=1 to sample where each stage spends its time
+    profiler = start_profiler_from_env()
+
+    # Initialize the cached sentence transformer encoder; the model is loaded on the first cache miss
+    encoder = get_encoder("all-MiniLM-L6-v2")
+
+    # Returning users are looked up by name instead of entering their profile again
+    name = input("Enter your name: ").strip()
+    with span("find_user_profile"):
+        try:
+            user_profile = get_profile_repository("Food_recommendation", "user_profile").find_by_name(name)
+        except Exception as e:
+            print(f"Could not look up your profile ({e})")
+            user_profile = None
+
+    if user_profile:
+        # Names are not unique, so the stored profile is only reused once the user recognizes it
+        print(f"Found a saved profile for {user_profile['name']}: "
+              f"{user_profile['weight_kg']} kg, {user_profile['height_cm']} cm, "
+              f"restrictions: {user_profile.get('dietary_restrictions') or 'none'}, "
+              f"preferences: {user_profile.get('dietary_preferences') or 'none'}")
+        if input("Is this your profile? [y/n]: ").strip().lower() in ("y", "yes"):
+            print(f"Welcome back, {user_profile['name']}")
+        else:
+            user_profile = None
+
+    if not user_profile:
+        # Sample dictionary to insert
+        with span("get_user_profile"):
+            user_profile = get_user_profile(name)
+
+        # Add dictionary to MongoDB
+        with span("add_dictionary_to_mongo"):
+            result = add_dictionary_to_mongo("Food_recommendation", "user_profile", user_profile)
+
+        if "error" not in result:
+            print("Successfull added")
+        else:
+            print("Operation failed")  # Optional: Handle the failure case
 
     # Process advanced user query through LM Studio
 
@@ -29,41 +218,32 @@ if __name__ == "__main__":
     # user_query = "0 saturated fat meals"
     # user_query = "Suggest me full day meals"
     user_query = input("Enter your meal suggestion query: ").strip()
-    optimized_user_query = optimize_meal_query(user_query)
-
-    # Filtered dictionary
-    user_data = {
-        'weight_kg': user_profile['weight_kg'],
-        'height_cm': user_profile['height_cm'],
-        'dietary_restrictions': user_profile['dietary_restrictions'],
-        'dietary_preferences': user_profile['dietary_preferences']
-    }
-
-    user_info = optimized_user_query + str(user_data)
-
-    # Use the processed query to search in Qdrant
-    query_vector = encoder.encode(user_info).tolist()
-    
-    client = QdrantClient(url="http://localhost:6338")
-    
-    hits = client.search(
-        collection_name="meals",
-        query_vector=query_vector,
-        limit=20,
-    )
-
-    meals = ""
-
-    # Display the top results
-    for hit in hits:
-        # print(hit.payload)
-        meals += str(hit.payload) + " "
-
-    # print(meals)
-
-    processed_query = get_query_from_lm_studio(user_info,meals)
-    print(processed_query)
-
-
 
+    with span("backend_load"):
+        backend = get_search_backend()
 
+    plan_request = parse_plan_request(user_query)
+    if plan_request:
+        # Plans are searched and generated per meal slot concurrently
+        plan = recommend_plan(profile_query_data(user_profile), user_query, encoder, backend, plan_request)
+        print(plan["answer"])
+    else:
+        user_info, meals, hits = retrieve_meals(profile_query_data(user_profile), user_query, encoder, backend)
+
+        # Print the answer as it is generated
+        metrics = {}
+        with span("llm"):
+            for token in stream_query_from_lm_studio(user_info, meals, metrics=metrics):
+                print(token, end="", flush=True)
+        print()
+        if "time_to_first_token" in metrics:
+            tracer.observe("llm_time_to_first_token_seconds", metrics["time_to_first_token"])
+        print(f"Time to first token: {metrics.get('time_to_first_token', float('nan')):.2f}s, "
+              f"total: {metrics['total_time']:.2f}s")
+
+    # Per-stage timings, so a slow run can be attributed to a stage
+    print(tracer.summary())
+    if profiler is not None:
+        profiler.stop()
+        for entry in profiler.top(10):
+            print(f"{entry['samples']:>6}  [{entry['stage']}] {entry['stack']}")
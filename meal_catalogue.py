@@ -0,0 +1,218 @@
+import argparse
+import json
+import math
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+from nutrients import NUTRIENT_FIELDS, parse_nutrients
+
+
+CATALOGUE_MAGIC = b"MCAT"
+CATALOGUE_VERSION = 1
+
+# Magic, version, row count, nutrient field count, restaurant count
+HEADER_FORMAT = "<4sIQII"
+SECTION_NAMES = (
+    "fields", "restaurant_offsets", "restaurant_heap", "restaurant_codes", "nutrients", "name_offsets", "name_heap",
+)
+# Offset and length in bytes of every section
+SECTION_FORMAT = "<" + "QQ" * len(SECTION_NAMES)
+SECTION_ALIGNMENT = 64
+
+
+class CatalogueWriter:
+    """
+    Builds a columnar meal catalogue file row by row.
+
+    Restaurant names are dictionary-encoded, nutrients are stored as a
+    float32 matrix (NaN where missing) and product names as offsets into one
+    UTF-8 string heap. Rows must be added in the order of the vector index.
+    """
+
+    def __init__(self, fields=NUTRIENT_FIELDS):
+        self.fields = tuple(fields)
+        self.restaurants = {}
+        self.restaurant_codes = array("I")
+        self.nutrients = array("f")
+        self.name_offsets = array("Q", [0])
+        self.name_heap = bytearray()
+
+    def __len__(self):
+        return len(self.restaurant_codes)
+
+    def add(self, record):
+        """
+        Appends one meal.
+
+        Args:
+            record (dict): Metadata row or payload with ``restaurant_name``, ``name`` and nutrient values.
+        """
+        restaurant = record.get("restaurant_name") or ""
+        self.restaurant_codes.append(self.restaurants.setdefault(restaurant, len(self.restaurants)))
+
+        nutrients = parse_nutrients(record)
+        self.nutrients.extend(nutrients.get(field, math.nan) for field in self.fields)
+
+        self.name_heap += (record.get("name") or "").encode("utf-8")
+        self.name_offsets.append(len(self.name_heap))
+
+    def save(self, path):
+        """
+        Writes the catalogue.
+
+        Args:
+            path (str): Destination file, e.g. next to ``vector_database.index``.
+        """
+        restaurant_heap = bytearray()
+        restaurant_offsets = array("Q", [0])
+        for name in self.restaurants:  # Dictionaries keep insertion order, which is the code order
+            restaurant_heap += name.encode("utf-8")
+            restaurant_offsets.append(len(restaurant_heap))
+
+        sections = [
+            "\n".join(self.fields).encode("utf-8"),
+            restaurant_offsets,
+            restaurant_heap,
+            self.restaurant_codes,
+            self.nutrients,
+            self.name_offsets,
+            self.name_heap,
+        ]
+        blobs = []
+        for section in sections:
+            if isinstance(section, array):
+                if sys.byteorder == "big":  # The file is always little-endian
+                    section = array(section.typecode, section)
+                    section.byteswap()
+                section = section.tobytes()
+            blobs.append(bytes(section))
+
+        position = struct.calcsize(HEADER_FORMAT) + struct.calcsize(SECTION_FORMAT)
+        table = []
+        for blob in blobs:
+            position += -position % SECTION_ALIGNMENT
+            table.extend((position, len(blob)))
+            position += len(blob)
+
+        with open(path, "wb") as file:
+            file.write(struct.pack(HEADER_FORMAT, CATALOGUE_MAGIC, CATALOGUE_VERSION, len(self), len(self.fields), len(self.restaurants)))
+            file.write(struct.pack(SECTION_FORMAT, *table))
+            for offset, blob in zip(table[::2], blobs):
+                file.write(b"\0" * (offset - file.tell()))
+                file.write(blob)
+
+
+def write_catalogue(path, records):
+    """
+    Writes a catalogue file from metadata rows.
+
+    Args:
+        path (str): Destination file.
+        records (Iterable[dict]): Rows in the order of the vector index.
+
+    Returns:
+        int: Number of rows written.
+    """
+    writer = CatalogueWriter()
+    for record in records:
+        writer.add(record)
+    writer.save(path)
+    return len(writer)
+
+
+class MealCatalogue:
+    """
+    Read-only, memory-mapped view of a catalogue written by ``CatalogueWriter``.
+
+    Opening it only parses the header and the restaurant dictionary, so it
+    takes the same time for a million meals as for a hundred. The nutrient
+    matrix is used in place for filtering, and a row's payload is only
+    decoded when that row is returned as a hit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+        header_size = struct.calcsize(HEADER_FORMAT)
+        magic, version, rows, field_count, restaurant_count = struct.unpack_from(HEADER_FORMAT, self._buffer)
+        if magic != CATALOGUE_MAGIC:
+            raise ValueError(f"{path} is not a meal catalogue")
+        if version != CATALOGUE_VERSION:
+            raise ValueError(f"Unsupported catalogue version {version} in {path}")
+        table = struct.unpack_from(SECTION_FORMAT, self._buffer, header_size)
+        sections = {
+            name: self._buffer[offset:offset + length]
+            for name, offset, length in zip(SECTION_NAMES, table[::2], table[1::2])
+        }
+
+        self.fields = tuple(bytes(sections["fields"]).decode("utf-8").split("\n")) if field_count else ()
+        restaurant_offsets = sections["restaurant_offsets"].view("<u8")
+        restaurant_heap = bytes(sections["restaurant_heap"])
+        self.restaurants = [
+            restaurant_heap[restaurant_offsets[code]:restaurant_offsets[code + 1]].decode("utf-8")
+            for code in range(restaurant_count)
+        ]
+
+        self.restaurant_codes = sections["restaurant_codes"].view("<u4")
+        self._name_offsets = sections["name_offsets"].view("<u8")
+        self._name_heap = sections["name_heap"]
+        stored = sections["nutrients"].view("<f4").reshape(rows, field_count)
+
+        # Columns follow NUTRIENT_FIELDS; files written with other fields are remapped once
+        if self.fields == NUTRIENT_FIELDS:
+            self.nutrients = stored
+        else:
+            self.nutrients = np.full((rows, len(NUTRIENT_FIELDS)), np.nan, dtype=np.float32)
+            for index, field in enumerate(self.fields):
+                if field in NUTRIENT_FIELDS:
+                    self.nutrients[:, NUTRIENT_FIELDS.index(field)] = stored[:, index]
+
+    def __len__(self):
+        return len(self.restaurant_codes)
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def name(self, row):
+        start, end = self._name_offsets[row], self._name_offsets[row + 1]
+        return bytes(self._name_heap[start:end]).decode("utf-8")
+
+    def restaurant_name(self, row):
+        return self.restaurants[self.restaurant_codes[row]]
+
+    def __getitem__(self, row):
+        """
+        Decodes the payload of one meal.
+
+        Args:
+            row (int): Row number, the same as in ``vector_database.index``.
+
+        Returns:
+            dict: ``restaurant_name``, ``name`` and the present values under
+            ``nutrients``, like a Qdrant payload.
+        """
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Catalogue row {row} out of range")
+
+        values = self.nutrients[row]
+        nutrients = {field: float(value) for field, value in zip(NUTRIENT_FIELDS, values) if not np.isnan(value)}
+        return {"restaurant_name": self.restaurant_name(row), "name": self.name(row), "nutrients": nutrients}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Convert metadata.json into the columnar meal catalogue.")
+    parser.add_argument("--metadata", default="metadata.json")
+    parser.add_argument("--output", default="vector_database.catalogue")
+    args = parser.parse_args()
+
+    with open(args.metadata, "r", encoding="utf-8") as file:
+        rows = write_catalogue(args.output, json.load(file))
+    print(f"Wrote {rows} meals to {args.output}")
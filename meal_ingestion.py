@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import NAMESPACE_URL, uuid5
+
+from encoding_pool import encode_batches
+from lexical_index import meal_lexical_text
+from meal_loader import batched
+from nutrients import NUTRIENT_FIELDS, parse_nutrients
+
+
+MEAL_COLLECTION = "meals"
+
+# Namespace for deterministic meal point IDs
+MEAL_ID_NAMESPACE = uuid5(NAMESPACE_URL, "food-recommendation/meals")
+
+# Touched whenever ingestion changes the meal collection
+CATALOGUE_VERSION_PATH = os.environ.get("CATALOGUE_VERSION_PATH", ".catalogue_version")
+
+# BM25 index over the names of the meals in the Qdrant collection
+MEAL_LEXICAL_INDEX_PATH = "meal_lexical_index.json"
+
+
+def bump_catalogue_version(path=CATALOGUE_VERSION_PATH):
+    """
+    Records that the meal collection changed.
+
+    Args:
+        path (str): Path of the version stamp file.
+    """
+    with open(path, "w") as file:
+        file.write(str(time.time_ns()))
+
+
+def catalogue_version(paths=(CATALOGUE_VERSION_PATH, "vector_database.index", "vector_database.catalogue", "metadata.json")):
+    """
+    Returns a cheap fingerprint of the meal catalogue.
+
+    The fingerprint changes when ingestion bumps the version stamp or when the
+    local index files are replaced.
+
+    Args:
+        paths (tuple[str]): Files whose modification times make up the fingerprint.
+
+    Returns:
+        tuple: Modification time of each file, or None for missing files.
+    """
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in paths)
+
+
+def build_meal_description(product):
+    """
+    Creates the descriptive string that is embedded for a product.
+
+    Args:
+        product (dict): Product entry from the restaurant catalogue.
+
+    Returns:
+        str: Text used as the input of the sentence encoder.
+    """
+    return (
+        f"{product['name']} with {product['calories']} calories, "
+        f"{product['total fat']} fat, {product['saturated fat']} saturated fat, "
+        f"{product['cholesterol']} cholesterol, {product['total carb']} carbs, "
+        f"{product['dietary fibre']} dietary fibre, {product['sugar']} sugar, "
+        f"{product['protein']} protein"
+    )
+
+
+def build_meal_payload(restaurant_name, product):
+    """
+    Creates the Qdrant payload stored next to a product vector.
+
+    Args:
+        restaurant_name (str): Name of the restaurant serving the product.
+        product (dict): Product entry from the restaurant catalogue.
+
+    Returns:
+        dict: Payload with the names, the parsed ``nutrients`` and a hash of its
+        content for change detection. The display strings are not stored, as
+        every reader uses the parsed values.
+    """
+    payload = {
+        "restaurant_name": restaurant_name,
+        "name": product["name"],
+        "nutrients": parse_nutrients(product),
+    }
+    payload["content_hash"] = hashlib.sha1(
+        json.dumps(payload, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return payload
+
+
+def meal_point_id(restaurant_name, product_name):
+    """
+    Derives a stable Qdrant point ID from the restaurant and product names.
+
+    Args:
+        restaurant_name (str): Name of the restaurant.
+        product_name (str): Name of the product.
+
+    Returns:
+        str: UUID that stays the same across ingestion runs.
+    """
+    return str(uuid5(MEAL_ID_NAMESPACE, f"{restaurant_name}\0{product_name}"))
+
+
+def meal_quantization_config(quantization):
+    """
+    Builds the Qdrant quantization settings for a quantization mode.
+
+    The compressed vectors are kept in RAM for candidate search while the
+    original vectors remain available for rescoring.
+
+    Args:
+        quantization (str): "int8", "binary", or None for full precision only.
+
+    Returns:
+        models.QuantizationConfig | None: Settings passed to ``create_collection``.
+    """
+    from qdrant_client import models
+
+    if quantization is None:
+        return None
+    if quantization == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+        )
+    if quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown quantization '{quantization}'. Choose one of: int8, binary")
+
+
+def ensure_meal_collection(client, dimension, collection_name=MEAL_COLLECTION, quantization=None):
+    """
+    Creates the meal collection unless it already exists, and indexes the
+    numeric nutrient payload fields used for pre-filtering.
+
+    Args:
+        client (QdrantClient): Qdrant client.
+        dimension (int): Size of the meal vectors.
+        collection_name (str): Name of the collection.
+        quantization (str): "int8" or "binary" to also store quantized vectors
+            in a new collection. Existing collections keep their settings.
+
+    Returns:
+        bool: True if the collection was created.
+    """
+    from qdrant_client import models
+
+    created = not client.collection_exists(collection_name)
+    if created:
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(
+                size=dimension,
+                distance=models.Distance.COSINE,
+            ),
+            quantization_config=meal_quantization_config(quantization),
+        )
+
+    # Creating an index that already exists is a no-op
+    for field in NUTRIENT_FIELDS:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=f"nutrients.{field}",
+            field_schema=models.PayloadSchemaType.FLOAT,
+        )
+    return created
+
+
+def fetch_stored_hashes(client, collection_name=MEAL_COLLECTION, page_size=1000):
+    """
+    Reads the content hash of every stored meal without fetching vectors.
+
+    Args:
+        client (QdrantClient): Qdrant client.
+        collection_name (str): Name of the collection.
+        page_size (int): Number of points fetched per scroll request.
+
+    Returns:
+        dict: Mapping of point ID to content hash.
+    """
+    stored = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=["content_hash"],
+            with_vectors=False,
+        )
+        for point in points:
+            stored[str(point.id)] = (point.payload or {}).get("content_hash")
+        if offset is None:
+            return stored
+
+
+def sync_meals(client, encoder, restaurants, collection_name=MEAL_COLLECTION, batch_size=256, lexical_index=None, quantization=None,
+               version_path=CATALOGUE_VERSION_PATH):
+    """
+    Brings the meal collection in line with the catalogue.
+
+    Only new or changed products are encoded and upserted, in batches of at
+    most ``batch_size`` points. Each upsert runs on a background thread while
+    the next batch is encoded. Products that are no longer in the catalogue
+    are deleted. Any change bumps the catalogue version so cached responses
+    are invalidated.
+
+    Args:
+        client (QdrantClient): Qdrant client.
+        encoder: Sentence encoder exposing ``encode`` and ``get_sentence_embedding_dimension``,
+            or an ``EncodingPool`` to encode on several processes.
+        restaurants (Iterable[dict]): Restaurants with their ``products``.
+        collection_name (str): Name of the collection.
+        batch_size (int): Maximum number of points per upsert.
+        lexical_index (BM25Index): Empty index that receives every catalogue meal under its point ID.
+        quantization (str): Quantization of a newly created collection, see ``ensure_meal_collection``.
+        version_path (str): Version stamp bumped on changes; point it elsewhere for
+            collections that no service answers from, e.g. in benchmarks.
+
+    Returns:
+        dict: Counts of upserted, unchanged and deleted meals.
+    """
+    from qdrant_client import models
+
+    ensure_meal_collection(client, encoder.get_sentence_embedding_dimension(), collection_name, quantization)
+    stored = fetch_stored_hashes(client, collection_name)
+
+    seen = set()
+    stats = {"upserted": 0, "unchanged": 0, "deleted": 0}
+
+    def changed_products():
+        for restaurant in restaurants:
+            restaurant_name = restaurant["restaurant_name"]
+            for product in restaurant["products"]:
+                point_id = meal_point_id(restaurant_name, product["name"])
+                if point_id in seen:
+                    continue
+                seen.add(point_id)
+
+                payload = build_meal_payload(restaurant_name, product)
+                if lexical_index is not None:
+                    lexical_index.add(point_id, meal_lexical_text(payload))
+
+                if stored.get(point_id) == payload["content_hash"]:
+                    stats["unchanged"] += 1
+                    continue
+
+                yield point_id, build_meal_description(product), payload
+
+    def upsert(batch, vectors):
+        client.upsert(
+            collection_name=collection_name,
+            points=[
+                models.PointStruct(id=point_id, vector=vector.tolist(), payload=payload)
+                for (point_id, _, payload), vector in zip(batch, vectors)
+            ],
+        )
+        stats["upserted"] += len(batch)
+
+    encoded = encode_batches(
+        encoder, batched(changed_products(), batch_size),
+        lambda batch: [description for _, description, _ in batch],
+    )
+
+    # One upsert in flight at a time, so a failed upsert stops the run early
+    with ThreadPoolExecutor(max_workers=1) as uploader:
+        upload = None
+        for batch, vectors in encoded:
+            if upload is not None:
+                upload.result()
+            upload = uploader.submit(upsert, batch, vectors)
+        if upload is not None:
+            upload.result()
+
+    removed = [point_id for point_id in stored if point_id not in seen]
+    for start in range(0, len(removed), batch_size):
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=removed[start:start + batch_size]),
+        )
+    stats["deleted"] = len(removed)
+
+    if stats["upserted"] or stats["deleted"]:
+        bump_catalogue_version(version_path)
+
+    return stats
@@ -0,0 +1,110 @@
+import json
+from itertools import islice
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yields the elements of a top-level JSON array one at a time.
+
+    The file is read in chunks and each element is decoded as soon as it is
+    complete, so only one element is held in memory at once.
+
+    Args:
+        path (str): Path to a JSON file containing an array.
+        chunk_size (int): Number of characters read per chunk.
+
+    Yields:
+        object: Decoded array elements, in file order.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8") as file:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+                pos += 1
+
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path} does not contain a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A number cut by the chunk boundary ("123|45" or "1.|5") also decodes,
+                    # so an element only counts once the separator after it has been read
+                    if eof or (end < len(buffer) and (buffer[end] in ",]" or buffer[end].isspace())):
+                        yield element
+                        buffer = buffer[end:]
+                        pos = 0
+                        continue
+            elif eof:
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+
+            # Read more data, growing the read size for elements larger than a chunk
+            chunk = file.read(max(chunk_size, len(buffer)))
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def iter_restaurants(path="Food_recommendation.meal_collection.json"):
+    """
+    Streams restaurants from the MongoDB export of the meal collection.
+
+    Args:
+        path (str): Path to the exported meal collection.
+
+    Yields:
+        dict: One restaurant with its ``products`` at a time.
+    """
+    yield from iter_json_array(path)
+
+
+def iter_products(path="Food_recommendation.meal_collection.json"):
+    """
+    Streams every product of the meal collection.
+
+    Args:
+        path (str): Path to the exported meal collection.
+
+    Yields:
+        tuple[str, dict]: Restaurant name and product entry.
+    """
+    for restaurant in iter_restaurants(path):
+        restaurant_name = restaurant["restaurant_name"]
+        for product in restaurant["products"]:
+            yield restaurant_name, product
+
+
+def batched(iterable, batch_size):
+    """
+    Groups an iterable into lists of at most ``batch_size`` items.
+
+    Args:
+        iterable (Iterable): Items to group.
+        batch_size (int): Maximum size of each batch.
+
+    Yields:
+        list: Consecutive batches of items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,263 @@
+import re
+from itertools import combinations
+from math import prod
+
+import numpy as np
+
+from nutrients import NUTRIENT_FIELDS, nutrient_columns
+
+
+# Column positions of the nutrients used by the planner
+CALORIES, TOTAL_FAT, SATURATED_FAT, CHOLESTEROL, TOTAL_CARB, _, SUGAR, PROTEIN = range(len(NUTRIENT_FIELDS))
+
+PLAN_PATTERN = re.compile(r"\b(?:meal\s*plan|plan|full\s+day|whole\s+day|per\s+day|daily|days?|week(?:ly)?)\b", re.IGNORECASE)
+DAYS_PATTERN = re.compile(r"\b(\d+)\s*days?\b", re.IGNORECASE)
+MEALS_PATTERN = re.compile(r"\b(\d+)\s*meals?\b", re.IGNORECASE)
+WEEK_PATTERN = re.compile(r"\bweek(?:ly)?\b", re.IGNORECASE)
+
+# Upper bound on the combinations scored at once, to keep planning in milliseconds
+MAX_COMBINATIONS = 200_000
+
+# Meal slots of a day by number of meals; extra meals beyond four are snacks
+MEAL_SLOTS = {
+    1: ("lunch",),
+    2: ("lunch", "dinner"),
+    3: ("breakfast", "lunch", "dinner"),
+}
+
+
+def parse_plan_request(query):
+    """
+    Detects whether a query asks for a meal plan and how large it is.
+
+    Args:
+        query (str): User query, e.g. "Suggest a 3 meal plan for 7 days".
+
+    Returns:
+        tuple[int, int] | None: Number of days and meals per day, or None for other queries.
+    """
+    if not PLAN_PATTERN.search(query):
+        return None
+
+    days = DAYS_PATTERN.search(query)
+    meals = MEALS_PATTERN.search(query)
+    if days:
+        day_count = int(days.group(1))
+    else:
+        day_count = 7 if WEEK_PATTERN.search(query) else 1
+    meal_count = int(meals.group(1)) if meals else 3
+    return max(1, min(day_count, 31)), max(1, min(meal_count, 6))
+
+
+def meal_slots(meals_per_day):
+    """
+    Names the meals of a day.
+
+    Args:
+        meals_per_day (int): Meals in each day.
+
+    Returns:
+        tuple[str]: One slot name per meal, e.g. ("breakfast", "lunch", "dinner").
+    """
+    if meals_per_day in MEAL_SLOTS:
+        return MEAL_SLOTS[meals_per_day]
+    return MEAL_SLOTS[3] + ("snack",) * (meals_per_day - 3)
+
+
+def strip_plan_terms(query):
+    """
+    Removes the plan wording from a query, keeping what it says about the food.
+
+    Args:
+        query (str): User query, e.g. "Weekly vegetarian plan".
+
+    Returns:
+        str: The remaining query, e.g. "vegetarian".
+    """
+    for pattern in (DAYS_PATTERN, MEALS_PATTERN, PLAN_PATTERN):
+        query = pattern.sub(" ", query)
+    return " ".join(query.split())
+
+
+def daily_targets(weight_kg, height_cm, age=30, activity_factor=1.4):
+    """
+    Derives daily nutrition targets from the profile's weight and height.
+
+    Energy uses the Mifflin-St Jeor equation with the average of its male and
+    female constants, since profiles carry neither age nor sex. Limits for
+    fat, saturated fat, sugar and cholesterol follow the Daily Values that the
+    catalogue's "% Daily Value" figures are based on.
+
+    Args:
+        weight_kg (float): Body weight in kilograms.
+        height_cm (float): Height in centimeters.
+        age (int): Assumed age in years.
+        activity_factor (float): Multiplier from resting to daily energy use.
+
+    Returns:
+        dict: Calorie target and macro bounds per day.
+    """
+    resting = 10 * weight_kg + 6.25 * height_cm - 5 * age - 78
+    calories = resting * activity_factor
+    return {
+        "calories": calories,
+        "protein_min": 0.8 * weight_kg,  # grams
+        "carb_min": 0.45 * calories / 4,  # grams, 45% of energy
+        "carb_max": 0.65 * calories / 4,  # grams, 65% of energy
+        "total_fat_max": 100.0,  # % Daily Value
+        "saturated_fat_max": 20.0,  # grams
+        "sugar_max": 50.0,  # grams
+        "cholesterol_max": 300.0,  # milligrams
+    }
+
+
+def _product_grid(sizes):
+    # Rows of one index per size, in the order of itertools.product
+    grids = np.meshgrid(*(np.arange(size, dtype=np.intp) for size in sizes), indexing="ij")
+    return np.stack(grids, axis=-1).reshape(-1, len(sizes))
+
+
+def _bound_violation(excess, bound):
+    # Unknown (NaN) totals count as a full violation, so missing data never meets a target
+    return np.where(np.isnan(excess), 1.0, np.maximum(excess, 0) / bound)
+
+
+def _combination_violations(totals, targets, calorie_tolerance, known):
+    # Sum of the relative violations of every bound; 0 when all targets are met.
+    # Bounds on nutrients that no candidate carries (known[column] False) are skipped,
+    # like nutrient filters on fields the catalogue lacks.
+    calories = totals[:, CALORIES]
+    violation = np.maximum(np.abs(calories - targets["calories"]) / targets["calories"] - calorie_tolerance, 0)
+    for column, excess, key in (
+        (PROTEIN, targets["protein_min"] - totals[:, PROTEIN], "protein_min"),
+        (TOTAL_CARB, targets["carb_min"] - totals[:, TOTAL_CARB], "carb_min"),
+        (TOTAL_CARB, totals[:, TOTAL_CARB] - targets["carb_max"], "carb_max"),
+        (TOTAL_FAT, totals[:, TOTAL_FAT] - targets["total_fat_max"], "total_fat_max"),
+        (SATURATED_FAT, totals[:, SATURATED_FAT] - targets["saturated_fat_max"], "saturated_fat_max"),
+        (SUGAR, totals[:, SUGAR] - targets["sugar_max"], "sugar_max"),
+        (CHOLESTEROL, totals[:, CHOLESTEROL] - targets["cholesterol_max"], "cholesterol_max"),
+    ):
+        if known[column]:
+            violation += _bound_violation(excess, targets[key])
+    return violation
+
+
+def plan_slot_meals(slot_hits, slots, targets, days=1, max_candidates=15, calorie_tolerance=0.1):
+    """
+    Picks one meal per slot for every day from slot-specific candidates.
+
+    Every combination of one candidate per slot is scored at once with NumPy;
+    combinations that use a meal twice in a day are excluded. A nutrient
+    missing from some meals of a combination leaves its total unknown, which
+    counts as not meeting that target, and targets on nutrients that no
+    candidate carries are ignored. Days are filled greedily without repeating a meal in the
+    same slot position until the candidates run out.
+
+    Args:
+        slot_hits (dict): Retrieved meals of each slot name, with ``payload`` and ``score``.
+        slots (tuple[str]): Slot names of a day, see ``meal_slots``.
+        targets (dict): Output of ``daily_targets``.
+        days (int): Number of days to plan.
+        max_candidates (int): Highest-scoring hits considered per slot, lowered
+            further when the combinations would exceed ``MAX_COMBINATIONS``.
+        calorie_tolerance (float): Allowed relative deviation from the calorie target.
+
+    Returns:
+        list[dict]: One plan per day with the ``slots`` and ``meals`` of the day, nutrient
+        ``totals`` (NaN where a meal lacks the nutrient) and whether it ``meets_targets``.
+    """
+    candidates = {}
+    for slot in dict.fromkeys(slots):
+        payloads = []
+        seen = set()
+        for hit in sorted(slot_hits.get(slot, []), key=lambda hit: hit.score, reverse=True):
+            key = (hit.payload.get("restaurant_name"), hit.payload.get("name"))
+            if key not in seen:
+                seen.add(key)
+                payloads.append(hit.payload)
+        columns = nutrient_columns(payloads)
+        usable = ~np.isnan(columns[:, CALORIES])
+        candidates[slot] = (
+            [payload for payload, keep in zip(payloads, usable) if keep][:max_candidates],
+            columns[usable][:max_candidates],
+        )
+    if any(not candidates[slot][0] for slot in slots):
+        return []
+
+    sizes = {slot: len(candidates[slot][0]) for slot in candidates}
+    while prod(sizes[slot] for slot in slots) > MAX_COMBINATIONS:
+        largest = max(sizes, key=sizes.get)
+        sizes[largest] -= 1
+
+    combos = _product_grid([sizes[slot] for slot in slots])
+    totals = sum(candidates[slot][1][combos[:, position]] for position, slot in enumerate(slots))
+    known = ~np.isnan(np.vstack([candidates[slot][1] for slot in candidates])).all(axis=0)
+    violations = _combination_violations(totals, targets, calorie_tolerance, known)
+    costs = 10 * violations + np.abs(totals[:, CALORIES] - targets["calories"]) / targets["calories"]
+
+    # A meal found for several slots, or for two snacks, must not be picked twice in a day
+    meal_ids = {}
+    slot_meal_ids = {
+        slot: np.array([
+            meal_ids.setdefault((payload.get("restaurant_name"), payload.get("name")), len(meal_ids))
+            for payload in candidates[slot][0][:sizes[slot]]
+        ], dtype=np.intp)
+        for slot in candidates
+    }
+    for first, second in combinations(range(len(slots)), 2):
+        same = slot_meal_ids[slots[first]][combos[:, first]] == slot_meal_ids[slots[second]][combos[:, second]]
+        costs[same] = np.inf
+
+    used = np.zeros((len(slots), max(sizes.values())), dtype=bool)
+    plans = []
+    for day in range(days):
+        repeats = np.zeros(len(combos), dtype=bool)
+        for position in range(len(slots)):
+            repeats |= used[position, combos[:, position]]
+        day_costs = np.where(repeats, np.inf, costs)
+        if np.isinf(day_costs).all():
+            used[:] = False
+            day_costs = costs
+        best = int(np.argmin(day_costs))
+        if np.isinf(day_costs[best]):
+            break
+        used[np.arange(len(slots)), combos[best]] = True
+
+        plans.append({
+            "day": day + 1,
+            "slots": list(slots),
+            "meals": [candidates[slot][0][combos[best, position]] for position, slot in enumerate(slots)],
+            "totals": {field: float(totals[best, index]) for index, field in enumerate(NUTRIENT_FIELDS)},
+            "meets_targets": bool(violations[best] == 0),
+        })
+    return plans
+
+
+def format_meal_plan(plans, targets):
+    """
+    Renders meal plans as short text for the LLM to phrase.
+
+    Args:
+        plans (list[dict]): Output of ``plan_slot_meals``.
+        targets (dict): Output of ``daily_targets``.
+
+    Returns:
+        str: One line per day with its meals and totals.
+    """
+    lines = [
+        f"Daily target: {targets['calories']:.0f} kcal, at least {targets['protein_min']:.0f}g protein, "
+        f"{targets['carb_min']:.0f}-{targets['carb_max']:.0f}g carbs"
+    ]
+    for plan in plans:
+        meals = "; ".join(
+            f"{slot.capitalize()}: {meal.get('name')}"
+            + (f" ({meal.get('restaurant_name')})" if meal.get("restaurant_name") else "")
+            for slot, meal in zip(plan["slots"], plan["meals"])
+        )
+        totals = {field: "?" if np.isnan(value) else f"{value:.0f}" for field, value in plan["totals"].items()}
+        lines.append(
+            f"Day {plan['day']}: {meals} = {totals['calories']} kcal, {totals['protein']}g protein, "
+            f"{totals['total_carb']}g carbs, {totals['total_fat']}% DV fat"
+            + ("" if plan["meets_targets"] else " (closest available)")
+        )
+    return "\n".join(lines)
@@ -0,0 +1,352 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+
+
+# Numeric nutrient columns, in column order, with the unit of the catalogue values
+NUTRIENT_UNITS = {
+    "calories": "kcal",
+    "total_fat": "% Daily Value",
+    "saturated_fat": "g",
+    "cholesterol": "mg",
+    "total_carb": "g",
+    "dietary_fibre": "g",
+    "sugar": "g",
+    "protein": "g",
+}
+NUTRIENT_FIELDS = tuple(NUTRIENT_UNITS)
+
+# A nutrient filter such as ("calories", "lt", 500.0); op is lt, lte, gt, gte, eq or about
+NutrientConstraint = namedtuple("NutrientConstraint", ["field", "op", "value"])
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+# Words that name each nutrient in a query; longer names are matched first
+NUTRIENT_SYNONYMS = {
+    "saturated_fat": ["saturated fats?", "sat fats?"],
+    "total_fat": ["total fats?", "fats?"],
+    "calories": ["calories", "calorie", "kcals?", "cals?"],
+    "cholesterol": ["cholesterol"],
+    "total_carb": ["carbohydrates?", "carbs?"],
+    "dietary_fibre": ["dietary fib(?:re|er)", "fib(?:re|er)"],
+    "sugar": ["sugars?"],
+    "protein": ["proteins?"],
+}
+COMPARATORS = {
+    "lt": ["under", "below", "less than", "fewer than", "lower than", "<"],
+    "lte": ["at most", "up to", "no more than", "maximum", "max", "<="],
+    "gt": ["over", "above", "more than", "greater than", "higher than", ">"],
+    "gte": ["at least", "no less than", "minimum", "min", ">="],
+}
+
+_NUTRIENT = "|".join(
+    f"(?P<{field}>{'|'.join(names)})" for field, names in NUTRIENT_SYNONYMS.items()
+)
+_COMPARATOR = "|".join(
+    f"(?P<{op}>{'|'.join(sorted(map(re.escape, words), key=len, reverse=True))})"
+    for op, words in COMPARATORS.items()
+)
+_UNIT = r"(?:\s*(?P<unit>g|grams?|mg|milligrams?|kcal|cal|%))?"
+
+# Comparator that a negation turns each comparator into: "not over 20g" means "at most 20g"
+NEGATED_COMPARATORS = {"lt": "gte", "lte": "gt", "gt": "lte", "gte": "lt"}
+
+# "don't want", "do not", "never", "avoid anything" directly before a constraint
+NEGATION_PATTERN = re.compile(
+    r"\b(?:not|never|avoid|dont|(?:do|does|did)\s*n[o']t)"
+    r"(?:\s+(?:want|need|like|eat|have|get|anything|something|meals?|food))*\s*$",
+    re.IGNORECASE,
+)
+
+# Grams per unit, to convert "500mg protein" into the catalogue's grams
+MASS_UNITS = {"g": 1.0, "gram": 1.0, "grams": 1.0, "mg": 0.001, "milligram": 0.001, "milligrams": 0.001}
+
+# Grams making up 100% of the FDA daily value, for columns stored as "% Daily Value"
+DAILY_VALUE_GRAMS = {"total_fat": 78.0}
+
+# A bare amount such as "2000 calories" matches values within this fraction of it
+APPROXIMATE_TOLERANCE = 0.1
+
+# "under 500 calories", "0 saturated fat", "at least 20g protein"
+CONSTRAINT_BEFORE_PATTERN = re.compile(
+    rf"(?:(?:{_COMPARATOR})\s*)?(?P<value>\d+(?:\.\d+)?){_UNIT}\s+(?:of\s+)?(?:{_NUTRIENT})\b",
+    re.IGNORECASE,
+)
+# "calories under 500", "protein at least 20g"
+CONSTRAINT_AFTER_PATTERN = re.compile(
+    rf"\b(?:{_NUTRIENT})\s+(?:(?P<negated>not|never)\s+)?(?:{_COMPARATOR})\s*(?P<value>\d+(?:\.\d+)?){_UNIT}(?!\w)",
+    re.IGNORECASE,
+)
+# "no sugar", "zero cholesterol", "sugar free", "sugar-free"
+CONSTRAINT_ZERO_PATTERN = re.compile(
+    rf"\b(?:(?P<prefix>no|zero|without)\s+)?(?:{_NUTRIENT})(?P<suffix>[\s-]free)?\b",
+    re.IGNORECASE,
+)
+# Cheap checks that skip the constraint patterns on queries that cannot match them
+CONSTRAINT_ZERO_HINT = re.compile(r"\b(?:no|zero|without)\b|free\b", re.IGNORECASE)
+
+
+def parse_nutrient_value(text):
+    """
+    Extracts the number from a display string such as "65g grams".
+
+    Args:
+        text (str | int | float | None): Catalogue value.
+
+    Returns:
+        float | None: The numeric value, or None when there is no number.
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = NUMBER_PATTERN.search(str(text))
+    return float(match.group()) if match else None
+
+
+def parse_nutrients(record):
+    """
+    Parses the nutrient display strings of a product into numbers.
+
+    Accepts both payload keys ("total_fat") and catalogue keys ("total fat"),
+    and payloads whose values were already parsed into ``nutrients``.
+
+    Args:
+        record (dict): Product entry, payload or metadata row.
+
+    Returns:
+        dict: Nutrient field to value, only for the fields present in ``record``.
+    """
+    if isinstance(record.get("nutrients"), dict):
+        return dict(record["nutrients"])
+
+    nutrients = {}
+    for field in NUTRIENT_FIELDS:
+        raw = record.get(field, record.get(field.replace("_", " ")))
+        value = parse_nutrient_value(raw)
+        if value is not None:
+            nutrients[field] = value
+    return nutrients
+
+
+def nutrient_columns(records):
+    """
+    Builds a columnar array of nutrient values.
+
+    Args:
+        records (list[dict]): Products, payloads or metadata rows.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (len(records), len(NUTRIENT_FIELDS)), NaN where missing.
+    """
+    columns = np.full((len(records), len(NUTRIENT_FIELDS)), np.nan, dtype=np.float32)
+    for row, record in enumerate(records):
+        for field, value in parse_nutrients(record).items():
+            columns[row, NUTRIENT_FIELDS.index(field)] = value
+    return columns
+
+
+def _matched_group(match, names):
+    return next(name for name in names if match.group(name) is not None)
+
+
+def convert_nutrient_value(field, value, unit):
+    """
+    Converts a value given in a query to the catalogue unit of a nutrient.
+
+    Mass units are converted between grams and milligrams, and into a
+    percentage of the daily value for "% Daily Value" columns such as
+    ``total_fat``. A missing unit means the catalogue unit.
+
+    Args:
+        field (str): Nutrient field, e.g. "protein".
+        value (float): Value typed by the user.
+        unit (str | None): Unit typed after the value, e.g. "mg".
+
+    Returns:
+        float | None: Value in the unit listed in ``NUTRIENT_UNITS``, or None
+        when the unit does not apply to the nutrient ("20 kcal protein").
+    """
+    unit = unit.lower() if unit else None
+    catalogue_unit = NUTRIENT_UNITS[field]
+    if unit is None:
+        return value
+    if unit in MASS_UNITS and catalogue_unit in MASS_UNITS:
+        return value * MASS_UNITS[unit] / MASS_UNITS[catalogue_unit]
+    if unit in MASS_UNITS and field in DAILY_VALUE_GRAMS:
+        return value * MASS_UNITS[unit] / DAILY_VALUE_GRAMS[field] * 100.0
+    if unit == "%" and catalogue_unit == "% Daily Value":
+        return value
+    if unit in ("kcal", "cal") and catalogue_unit == "kcal":
+        return value
+    return None
+
+
+def find_nutrient_constraints(query):
+    """
+    Finds numeric nutrient constraints and where they are in a query.
+
+    A negation before the comparison ("I don't want more than 20g fat",
+    "fat not over 20g") turns it into the opposite bound, which then starts
+    at the negation. Negated targets without a comparison ("not 2000
+    calories", "not sugar free") are dropped, since they exclude no range.
+
+    Args:
+        query (str): User query.
+
+    Returns:
+        list[tuple[int, int, NutrientConstraint]]: Start and end offset of each
+        match with its constraint, in the order they appear in the query.
+    """
+    found = []
+
+    numeric_patterns = (CONSTRAINT_BEFORE_PATTERN, CONSTRAINT_AFTER_PATTERN) if NUMBER_PATTERN.search(query) else ()
+    claimed = set()
+    for pattern in numeric_patterns:
+        for match in pattern.finditer(query):
+            # Each number belongs to one nutrient, preferring the one it precedes:
+            # "2000 calories under 15 fat" does not mean "calories under 15"
+            if match.start("value") in claimed:
+                continue
+            claimed.add(match.start("value"))
+            field = _matched_group(match, NUTRIENT_SYNONYMS)
+            value = convert_nutrient_value(field, float(match.group("value")), match.group("unit"))
+            if value is None:
+                continue  # Units that cannot be compared are ignored rather than mixed
+            # A bare amount ("2000 calories") is a target, except for zero ("0 saturated fat")
+            op = next((op for op in COMPARATORS if match.group(op) is not None), "eq" if value == 0 else "about")
+            start = match.start()
+            negation = NEGATION_PATTERN.search(query, 0, start)
+            if negation is not None or match.groupdict().get("negated") is not None:
+                if op not in NEGATED_COMPARATORS:
+                    continue
+                op = NEGATED_COMPARATORS[op]
+                start = negation.start() if negation is not None else start
+            found.append((start, match.end(), NutrientConstraint(field, op, value)))
+
+    zero_matches = CONSTRAINT_ZERO_PATTERN.finditer(query) if CONSTRAINT_ZERO_HINT.search(query) else ()
+    for match in zero_matches:
+        if match.group("prefix") is None and match.group("suffix") is None:
+            continue
+        if NEGATION_PATTERN.search(query, 0, match.start()) is not None:
+            continue
+        field = _matched_group(match, NUTRIENT_SYNONYMS)
+        found.append((match.start(), match.end(), NutrientConstraint(field, "eq", 0.0)))
+
+    return sorted(found, key=lambda item: item[0])
+
+
+def extract_nutrient_constraints(query):
+    """
+    Finds numeric nutrient constraints in a free-text query.
+
+    Values are converted to the catalogue units listed in ``NUTRIENT_UNITS``
+    when a mass unit is given ("500mg protein"). Zero ("0 saturated fat",
+    "no sugar") means an exact match, and another bare amount ("2000
+    calories") matches values within ``APPROXIMATE_TOLERANCE`` of it.
+
+    Args:
+        query (str): User query.
+
+    Returns:
+        list[NutrientConstraint]: Constraints in the order they appear in the query.
+    """
+    constraints = []
+    for _, _, constraint in find_nutrient_constraints(query):
+        if constraint not in constraints:
+            constraints.append(constraint)
+    return constraints
+
+
+def applicable_constraints(constraints, fields):
+    """
+    Drops the constraints on nutrients that no meal of a catalogue carries.
+
+    A column without any known value would reject every meal, so a query
+    such as "no sugar" is searched without that constraint instead of
+    returning nothing.
+
+    Args:
+        constraints (list[NutrientConstraint]): Constraints found in a query.
+        fields (Collection[str]): Nutrient fields with at least one known value.
+
+    Returns:
+        list[NutrientConstraint]: Constraints that can be evaluated.
+    """
+    return [constraint for constraint in constraints or () if constraint.field in fields]
+
+
+def relax_constraints(constraints):
+    """
+    Drops the approximate targets ("2000 calories") and keeps the hard bounds.
+
+    Backends search again with these when no meal is close to a target,
+    e.g. a daily calorie amount that no single meal reaches.
+
+    Args:
+        constraints (list[NutrientConstraint]): Constraints of a query.
+
+    Returns:
+        list[NutrientConstraint]: Constraints other than ``about``.
+    """
+    return [constraint for constraint in constraints or () if constraint.op != "about"]
+
+
+def constraint_mask(columns, constraints):
+    """
+    Evaluates nutrient constraints against a columnar nutrient array.
+
+    Rows with a missing value for a constrained nutrient never match; use
+    ``applicable_constraints`` first to ignore nutrients missing everywhere.
+
+    Args:
+        columns (numpy.ndarray): Output of ``nutrient_columns``.
+        constraints (list[NutrientConstraint]): Constraints to apply.
+
+    Returns:
+        numpy.ndarray: Boolean mask of the rows satisfying every constraint.
+    """
+    mask = np.ones(columns.shape[0], dtype=bool)
+    for field, op, value in constraints:
+        column = columns[:, NUTRIENT_FIELDS.index(field)]
+        if op == "lt":
+            mask &= column < value
+        elif op == "lte":
+            mask &= column <= value
+        elif op == "gt":
+            mask &= column > value
+        elif op == "gte":
+            mask &= column >= value
+        elif op == "about":
+            mask &= np.abs(column - value) <= APPROXIMATE_TOLERANCE * value
+        else:
+            mask &= column == value
+    return mask
+
+
+def qdrant_nutrient_filter(constraints):
+    """
+    Translates nutrient constraints into a Qdrant payload filter.
+
+    Args:
+        constraints (list[NutrientConstraint]): Constraints to apply.
+
+    Returns:
+        models.Filter | None: Filter on the ``nutrients.*`` payload fields, or None without constraints.
+    """
+    if not constraints:
+        return None
+
+    from qdrant_client import models
+
+    conditions = []
+    for field, op, value in constraints:
+        if op == "eq":
+            bounds = {"gte": value, "lte": value}
+        elif op == "about":
+            bounds = {"gte": value * (1 - APPROXIMATE_TOLERANCE), "lte": value * (1 + APPROXIMATE_TOLERANCE)}
+        else:
+            bounds = {op: value}
+        conditions.append(models.FieldCondition(key=f"nutrients.{field}", range=models.Range(**bounds)))
+    return models.Filter(must=conditions)
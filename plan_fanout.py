@@ -0,0 +1,130 @@
+import asyncio
+
+from meal_planner import daily_targets, format_meal_plan, meal_slots, plan_slot_meals, strip_plan_terms
+from prompt_builder import build_meal_context
+from query_normalizer import get_query_normalizer
+from recommend_meal import get_query_from_lm_studio
+from tracing import span
+
+
+def slot_query(slot, user_query):
+    """
+    Builds the search query of one meal slot from the user's plan request.
+
+    Args:
+        slot (str): Slot name, e.g. "breakfast".
+        user_query (str): Plan request typed by the user.
+
+    Returns:
+        str: Query for the slot, e.g. "breakfast high protein".
+    """
+    return f"{slot} {strip_plan_terms(user_query)}".strip()
+
+
+async def search_slots(slot_vectors, backend, constraints=None, limit=20, slot_texts=None):
+    """
+    Runs the searches of all slots concurrently.
+
+    Backends with a ``search_async`` method are awaited directly; the others
+    search on the default executor, so the slowest search bounds the total.
+
+    Args:
+        slot_vectors (dict): Encoded query of each slot name.
+        backend: Search backend from ``get_search_backend``.
+        constraints (list[NutrientConstraint]): Nutrient constraints applied to every slot.
+        limit (int): Maximum number of hits per slot.
+        slot_texts (dict): Raw query of each slot, for ``HybridSearchBackend``.
+
+    Returns:
+        dict: Hits of each slot name.
+    """
+    slot_texts = slot_texts or {}
+    loop = asyncio.get_running_loop()
+
+    async def search(slot, vector):
+        with span("search", slot=slot):
+            if hasattr(backend, "search_async"):
+                return await backend.search_async(vector, limit, constraints, slot_texts.get(slot))
+            return await loop.run_in_executor(
+                None, lambda: backend.search(vector, limit=limit, constraints=constraints, query_text=slot_texts.get(slot))
+            )
+
+    slots = list(slot_vectors)
+    results = await asyncio.gather(*(search(slot, slot_vectors[slot]) for slot in slots))
+    return dict(zip(slots, results))
+
+
+async def recommend_plan_async(user_data, user_query, encoder, backend, plan_request, limit=20, llm_concurrency=4):
+    """
+    Answers a meal plan request with one search and one LLM call per meal slot.
+
+    The plan is split into slots such as breakfast, lunch and dinner. All
+    slot queries are encoded in one batch and searched concurrently, a
+    day-by-day plan is solved from the slot candidates, and each slot's part
+    of the answer is generated with at most ``llm_concurrency`` LLM calls in
+    flight. Blocking work runs on the default executor.
+
+    Args:
+        user_data (dict): Output of ``profile_query_data``.
+        user_query (str): Plan request typed by the user.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+        backend: Search backend from ``get_search_backend``.
+        plan_request (tuple[int, int]): Days and meals per day from ``parse_plan_request``.
+        limit (int): Number of meals retrieved per slot.
+        llm_concurrency (int): Maximum number of simultaneous LLM calls.
+
+    Returns:
+        dict: The combined ``answer``, all ``hits``, the hits of each slot in
+        ``slot_hits`` and the daily ``plans``.
+    """
+    loop = asyncio.get_running_loop()
+    days, meals_per_day = plan_request
+    slots = meal_slots(meals_per_day)
+    kinds = list(dict.fromkeys(slots))
+
+    normalizer = get_query_normalizer()
+    slot_texts = {slot: slot_query(slot, user_query) for slot in kinds}
+    slot_infos = {slot: normalizer.normalize(slot_texts[slot]).text + str(user_data) for slot in kinds}
+    with span("encode", slots=len(kinds)):
+        vectors = await loop.run_in_executor(None, encoder.encode, [slot_infos[slot] for slot in kinds])
+
+    # Already normalized, and cached, when the request went through ``encode_user_query``
+    constraints = list(normalizer.normalize(user_query).constraints)
+    slot_hits = await search_slots(dict(zip(kinds, vectors)), backend, constraints, limit, slot_texts)
+
+    targets = daily_targets(user_data["weight_kg"], user_data["height_cm"])
+    with span("plan_meals", days=days, meals_per_day=meals_per_day):
+        plans = plan_slot_meals(slot_hits, slots, targets, days=days)
+
+    limiter = asyncio.Semaphore(llm_concurrency)
+
+    async def generate(slot):
+        # Each call sees its slot's candidates and the plan, so it only has to phrase its part
+        meals = build_meal_context(slot_hits[slot])
+        if plans:
+            meals = "Meal plan:\n" + format_meal_plan(plans, targets) + "\n\n" + meals
+        request = f"{slot_infos[slot]} Describe the {slot} of each day in the meal plan."
+        async with limiter:
+            with span("llm", slot=slot):
+                return await loop.run_in_executor(None, get_query_from_lm_studio, request, meals)
+
+    answers = await asyncio.gather(*(generate(slot) for slot in kinds))
+
+    return {
+        "answer": "\n\n".join(f"{slot.capitalize()}:\n{answer}" for slot, answer in zip(kinds, answers)),
+        "hits": [hit for slot in kinds for hit in slot_hits[slot]],
+        "slot_hits": slot_hits,
+        "plans": plans,
+    }
+
+
+def recommend_plan(user_data, user_query, encoder, backend, plan_request, limit=20, llm_concurrency=4):
+    """
+    Runs ``recommend_plan_async`` from synchronous code.
+
+    Must not be called from a running event loop; await
+    ``recommend_plan_async`` there instead.
+    """
+    return asyncio.run(
+        recommend_plan_async(user_data, user_query, encoder, backend, plan_request, limit, llm_concurrency)
+    )
@@ -0,0 +1,126 @@
+import math
+
+from nutrients import NUTRIENT_FIELDS, parse_nutrients
+
+
+# Short column headers with the unit of each nutrient column
+NUTRIENT_HEADERS = {
+    "calories": "kcal",
+    "total_fat": "fat%DV",
+    "saturated_fat": "satfat g",
+    "cholesterol": "chol mg",
+    "total_carb": "carb g",
+    "dietary_fibre": "fibre g",
+    "sugar": "sugar g",
+    "protein": "protein g",
+}
+
+DEFAULT_TOKEN_BUDGET = 600
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of LLM tokens in a text.
+
+    Uses the common approximation of four characters per token, which is
+    close enough for budgeting without loading the model tokenizer.
+
+    Args:
+        text (str): Prompt text.
+
+    Returns:
+        int: Estimated token count.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def _format_number(value):
+    if value is None:
+        return "-"
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}"
+
+
+def _meal_row(payload):
+    nutrients = payload.get("nutrients") or parse_nutrients(payload)
+    return (
+        payload.get("restaurant_name", ""),
+        payload.get("name", ""),
+        tuple(nutrients.get(field) for field in NUTRIENT_FIELDS),
+    )
+
+
+def render_meal_table(rows):
+    """
+    Renders meal rows as a compact pipe-separated table.
+
+    Nutrient columns without any value are left out. Columns that hold the same
+    value for every row are written once in a note above the table.
+
+    Args:
+        rows (list[tuple]): Restaurant, meal name and nutrient values in ``NUTRIENT_FIELDS`` order.
+
+    Returns:
+        str: The rendered table, or an empty string without rows.
+    """
+    if not rows:
+        return ""
+
+    notes = []
+    restaurants = {restaurant for restaurant, _, _ in rows}
+    show_restaurant = len(restaurants) > 1
+    if not show_restaurant and rows[0][0]:
+        notes.append(f"restaurant={rows[0][0]}")
+
+    columns = []
+    for index, field in enumerate(NUTRIENT_FIELDS):
+        values = {nutrients[index] for _, _, nutrients in rows}
+        if values == {None}:
+            continue
+        if len(rows) > 1 and len(values) == 1:
+            notes.append(f"{NUTRIENT_HEADERS[field]}={_format_number(values.pop())}")
+            continue
+        columns.append(index)
+
+    header = (["restaurant"] if show_restaurant else []) + ["meal"] + [
+        NUTRIENT_HEADERS[NUTRIENT_FIELDS[index]] for index in columns
+    ]
+    lines = []
+    if notes:
+        lines.append("All meals: " + ", ".join(notes))
+    lines.append("|".join(header))
+    for restaurant, name, nutrients in rows:
+        cells = ([restaurant] if show_restaurant else []) + [name] + [
+            _format_number(nutrients[index]) for index in columns
+        ]
+        lines.append("|".join(cells))
+    return "\n".join(lines)
+
+
+def build_meal_context(hits, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Assembles the meals knowledge database passed to the LLM.
+
+    Duplicate meals are removed and the lowest-scoring hits are dropped until
+    the rendered table fits in ``token_budget``.
+
+    Args:
+        hits (list): Search hits with ``payload`` and ``score``.
+        token_budget (int): Maximum estimated tokens of the rendered context.
+
+    Returns:
+        str: Compact meal table.
+    """
+    rows = []
+    seen = set()
+    for hit in sorted(hits, key=lambda hit: hit.score, reverse=True):
+        row = _meal_row(hit.payload)
+        if row[:2] in seen:
+            continue
+        seen.add(row[:2])
+        rows.append(row)
+
+    context = render_meal_table(rows)
+    while len(rows) > 1 and estimate_tokens(context) > token_budget:
+        rows.pop()
+        context = render_meal_table(rows)
+    return context
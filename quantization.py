@@ -0,0 +1,184 @@
+import json
+import os
+
+import numpy as np
+
+
+QUANTIZATION_MODES = ("int8", "binary")
+
+# Number of set bits in every byte value, for Hamming distances on packed codes
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors):
+    """
+    Scalar-quantizes vectors to int8 with one symmetric scale per vector.
+
+    Args:
+        vectors (numpy.ndarray): float32 vectors, one per row.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: int8 codes and float32 scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """
+    Quantizes vectors to one sign bit per dimension, packed into bytes.
+
+    Args:
+        vectors (numpy.ndarray): float32 vectors, one per row.
+
+    Returns:
+        numpy.ndarray: uint8 codes of shape (rows, ceil(dimension / 8)).
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class QuantizedIndex:
+    """
+    Compressed copy of a vector matrix with full-precision rescoring.
+
+    Candidates are ranked on the int8 (4x smaller) or binary (32x smaller)
+    codes, then the best ``limit * oversampling`` are rescored with exact
+    cosine similarity against the original vectors, which stay memory-mapped
+    on disk and are only read for those candidates.
+    """
+
+    # Rows of int8 codes widened to float32 at a time while scoring
+    SCORE_BLOCK = 8192
+
+    def __init__(self, vectors, mode="int8", oversampling=4.0, codes_path=None, chunk_size=65536):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{mode}'. Choose one of: {', '.join(QUANTIZATION_MODES)}")
+        self.vectors = vectors
+        self.mode = mode
+        self.oversampling = oversampling
+
+        # Codes can be cached next to the index as two .npy files and memory-mapped on later loads.
+        # A third file records the index they were built from, so a rebuilt index is re-quantized.
+        codes_file = scales_file = source_file = None
+        if codes_path:
+            codes_file, scales_file = f"{codes_path}.{mode}.codes.npy", f"{codes_path}.{mode}.scales.npy"
+            source_file = f"{codes_path}.{mode}.source.json"
+        source = self._source_fingerprint(codes_path, len(vectors))
+
+        if codes_file and self._cached_codes_match(codes_file, scales_file, source_file, source):
+            self.codes = np.load(codes_file, mmap_mode="r")
+            self.scales = np.load(scales_file, mmap_mode="r")
+        else:
+            self.codes, self.scales = self._quantize(chunk_size)
+            if codes_file:
+                np.save(codes_file, self.codes)
+                np.save(scales_file, self.scales)
+                with open(source_file, "w") as file:
+                    json.dump(source, file)
+
+        norms = np.concatenate([
+            np.linalg.norm(vectors[start:start + chunk_size], axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ]) if len(vectors) else np.empty(0, dtype=np.float32)
+        norms[norms == 0] = 1.0
+        self.norms = norms
+
+    @staticmethod
+    def _source_fingerprint(codes_path, rows):
+        # Size and modification time of the vector file, like ``catalogue_version``
+        fingerprint = {"rows": rows}
+        if codes_path and os.path.exists(codes_path):
+            stat = os.stat(codes_path)
+            fingerprint.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return fingerprint
+
+    @staticmethod
+    def _cached_codes_match(codes_file, scales_file, source_file, source):
+        if not all(os.path.exists(path) for path in (codes_file, scales_file, source_file)):
+            return False
+        with open(source_file, "r") as file:
+            return json.load(file) == source
+
+    def _quantize(self, chunk_size):
+        # Quantize in chunks so the float32 matrix is never copied into memory at once
+        codes, scales = [], []
+        for start in range(0, len(self.vectors), chunk_size):
+            chunk = np.asarray(self.vectors[start:start + chunk_size], dtype=np.float32)
+            if self.mode == "int8":
+                chunk_codes, chunk_scales = quantize_int8(chunk)
+            else:
+                chunk_codes, chunk_scales = quantize_binary(chunk), np.ones(len(chunk), dtype=np.float32)
+            codes.append(chunk_codes)
+            scales.append(chunk_scales)
+        if not codes:
+            width = self.vectors.shape[1] if self.mode == "int8" else (self.vectors.shape[1] + 7) // 8
+            return np.empty((0, width), dtype=np.int8 if self.mode == "int8" else np.uint8), np.empty(0, np.float32)
+        return np.concatenate(codes), np.concatenate(scales)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate_scores(self, query, rows=None):
+        """
+        Scores rows on their quantized codes; higher is more similar.
+
+        Args:
+            query (numpy.ndarray): float32 query vector.
+            rows (numpy.ndarray): Row numbers to score, or None for every row.
+
+        Returns:
+            numpy.ndarray: One approximate score per scored row.
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "int8":
+            scales = self.scales if rows is None else self.scales[rows]
+            norms = self.norms if rows is None else self.norms[rows]
+            query_codes = quantize_int8(query[None, :])[0][0].astype(np.float32)
+
+            # Widen small blocks of codes to float32 so the dot products run on BLAS
+            dots = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), self.SCORE_BLOCK):
+                block = codes[start:start + self.SCORE_BLOCK]
+                dots[start:start + len(block)] = block.astype(np.float32) @ query_codes
+            return dots * scales / norms
+
+        # Fewer differing sign bits means a smaller angle
+        query_bits = quantize_binary(query[None, :])[0]
+        differing = np.bitwise_xor(codes, query_bits)
+        if hasattr(np, "bitwise_count") and differing.shape[1] % 8 == 0:
+            distances = np.bitwise_count(np.ascontiguousarray(differing).view(np.uint64)).sum(axis=1, dtype=np.int32)
+        else:
+            distances = POPCOUNT_TABLE[differing].sum(axis=1, dtype=np.int32)
+        return -distances.astype(np.float32)
+
+    def search(self, query_vector, limit=10, rows=None):
+        """
+        Finds the most similar rows with quantized scoring and exact rescoring.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            limit (int): Maximum number of results.
+            rows (numpy.ndarray): Row numbers to restrict the search to, or None for every row.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: Row numbers and exact cosine scores, best first.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        approximate = self.approximate_scores(query, rows)
+
+        candidates = min(len(approximate), max(limit, int(np.ceil(limit * self.oversampling))))
+        if candidates <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-approximate, candidates - 1)[:candidates]
+        top_rows = top if rows is None else np.asarray(rows)[top]
+        top_rows = np.sort(top_rows)  # Sequential reads from the memory-mapped vectors
+
+        query_norm = np.linalg.norm(query) or 1.0
+        exact = (self.vectors[top_rows] @ query) / (self.norms[top_rows] * query_norm)
+
+        order = np.argsort(-exact)[:limit]
+        return top_rows[order], exact[order]
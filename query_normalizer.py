@@ -0,0 +1,117 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from nutrients import find_nutrient_constraints
+
+
+# Single words and multi-word phrases that carry no meal information
+REMOVE_KEYWORDS = frozenset({"can", "you", "suggest", "i", "need", "what", "and", "a", "the", "please", "recommend"})
+REMOVE_PHRASES = (
+    "i am", "i'm", "i want", "i would like", "can you", "could you", "would you", "give me", "show me", "suggest me",
+)
+
+# Words, contractions such as "don't" and numbers with an attached unit such as "20g" or "5%"
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)?(?:%|[^\W\d_]+)?|[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# Result of ``QueryNormalizer.normalize``: the cleaned ``text`` used for encoding,
+# its ``tokens`` and the nutrient ``constraints`` found in the query
+NormalizedQuery = namedtuple("NormalizedQuery", ["text", "tokens", "constraints"])
+
+
+@lru_cache(maxsize=None)
+def load_stop_words(language="english"):
+    """
+    Loads the NLTK stop word list of a language once per process.
+
+    Args:
+        language (str): Name of the NLTK stop word list.
+
+    Returns:
+        frozenset[str]: Stop words.
+    """
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words(language))
+
+
+class QueryNormalizer:
+    """
+    Cleans meal queries before they are encoded.
+
+    Vocabularies are loaded and patterns compiled once, when the normalizer
+    is created. A query is lowercased, the filler phrases are removed in one
+    regex pass, and the remaining text is tokenized and filtered against a
+    single stop word set. Nutrient constraints such as "no sugar" or "under
+    500 calories" are kept verbatim instead of being filtered, since their
+    stop words ("no", "under") carry the intent. Results are cached, so
+    repeated queries cost a dictionary lookup.
+    """
+
+    def __init__(self, stop_words=None, remove_keywords=REMOVE_KEYWORDS, remove_phrases=REMOVE_PHRASES, cache_size=65536):
+        self.stop_words = frozenset(load_stop_words() if stop_words is None else stop_words) | frozenset(remove_keywords)
+
+        # Longer phrases first, so "i would like" wins over a shorter overlapping phrase
+        phrases = sorted((re.escape(phrase) for phrase in remove_phrases), key=len, reverse=True)
+        self.phrase_pattern = re.compile(rf"\b(?:{'|'.join(phrases)})\b") if phrases else None
+
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _tokens(self, text):
+        if self.phrase_pattern is not None:
+            text = self.phrase_pattern.sub(" ", text)
+        return [token for token in TOKEN_PATTERN.findall(text) if token not in self.stop_words]
+
+    def _normalize(self, query):
+        """
+        Normalizes one query; called through the cached ``normalize``.
+
+        Args:
+            query (str): Query typed by the user.
+
+        Returns:
+            NormalizedQuery: Cleaned text, its tokens and the nutrient constraints.
+        """
+        query = query.lower()
+        matches = find_nutrient_constraints(query)
+
+        tokens = []
+        position = 0
+        for start, end, _ in matches:
+            if start < position:
+                # Overlaps the constraint text kept just before, so only its remainder is added
+                tokens.extend(TOKEN_PATTERN.findall(query[position:end]))
+                position = max(position, end)
+                continue
+            tokens.extend(self._tokens(query[position:start]))
+            tokens.extend(TOKEN_PATTERN.findall(query[start:end]))
+            position = end
+        tokens.extend(self._tokens(query[position:]))
+
+        constraints = tuple(dict.fromkeys(constraint for _, _, constraint in matches))
+        return NormalizedQuery(" ".join(tokens), tuple(tokens), constraints)
+
+    def normalize_batch(self, queries):
+        """
+        Normalizes many queries, processing each distinct query only once.
+
+        Args:
+            queries (Iterable[str]): Queries, e.g. one per user of a batch.
+
+        Returns:
+            list[NormalizedQuery]: One result per query, in input order.
+        """
+        queries = list(queries)
+        normalized = {query: self.normalize(query) for query in set(queries)}
+        return [normalized[query] for query in queries]
+
+
+@lru_cache(maxsize=None)
+def get_query_normalizer():
+    """
+    Returns the process-wide query normalizer.
+
+    Returns:
+        QueryNormalizer: Shared normalizer using the NLTK English stop words.
+    """
+    return QueryNormalizer()
@@ -1,67 +1,176 @@
-from qdrant_client import QdrantClient
+import json
+import logging
+import threading
+import time
 
-import requests
-from nltk.corpus import stopwords
 from user_profile import get_user_profile
 
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_LM_STUDIO_POOL_SIZE = 16
+
+# One session per process, created by the first get_lm_studio_session call
+_lm_studio_session = None
+_lm_studio_pool_size = None
+_lm_studio_session_lock = threading.Lock()
+
+
+def get_lm_studio_session(pool_size=None):
+    """
+    Returns the shared HTTP session used for LM Studio requests.
+
+    Keeping one session reuses pooled keep-alive connections instead of
+    opening a new connection for every recommendation. The pool is sized by
+    the first call, so warm it up with the concurrency of the process (the
+    service and batch runs do); later calls return the same session whatever
+    they pass.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host, used
+            when the session is created. Defaults to ``DEFAULT_LM_STUDIO_POOL_SIZE``.
+
+    Returns:
+        requests.Session: Shared session.
+    """
+    global _lm_studio_session, _lm_studio_pool_size
+
+    with _lm_studio_session_lock:
+        if _lm_studio_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _lm_studio_pool_size = pool_size or DEFAULT_LM_STUDIO_POOL_SIZE
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_lm_studio_pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _lm_studio_session = session
+        elif pool_size and pool_size > _lm_studio_pool_size:
+            logger.warning("LM Studio connection pool has %d connections, %d were requested", _lm_studio_pool_size, pool_size)
+        return _lm_studio_session
+
 
 # Define a function to clean the query
 def optimize_meal_query(user_query):
+    """
+    Removes the words that carry no meal information from a query.
+
+    Delegates to the shared ``QueryNormalizer``, which loads the stop words
+    once and caches its results.
+
+    Args:
+        user_query (str): Query typed by the user.
+
+    Returns:
+        str: Cleaned, lowercased query, e.g. "high protein breakfast under 500 calories".
+    """
+    from query_normalizer import get_query_normalizer
+
+    return get_query_normalizer().normalize(user_query).text
+
+
+LM_STUDIO_URL = "http://127.0.0.1:1234/v1/chat/completions"  # Replace with your LM Studio endpoint
+
 
-    # Define relevant keywords
-    remove_keywords = {"can", "you", "suggest", "I", "need", "what", "and", "a","the","I am",}
-    
-    # Tokenize the query into words
-    words = user_query.lower().split()
-    
-    # Get stop words
-    stop_words = set(stopwords.words("english"))
-    
-    # Filter words: Keep only relevant and non-stop words
-    optimized_words = [
-        word for word in words if word not in remove_keywords and word not in stop_words
-    ]
-    
-    # Join the words back into a cleaned query
-    optimized_query = " ".join(optimized_words)
-    return optimized_query
-
-
-def get_query_from_lm_studio(query,knowledge_db):
-
-    # Initialize the Qdrant client
-    client = QdrantClient(url="http://localhost:6338")
-
-    lm_studio_url = "http://127.0.0.1:1234/v1/chat/completions"  # Replace with your LM Studio endpoint
-    payload = {
+def build_lm_studio_payload(query, knowledge_db, stream=False):
+    """
+    Creates the chat completion request sent to LM Studio.
+
+    Args:
+        query (str): Optimized user query with the user profile details.
+        knowledge_db (str): Retrieved meals used as context, e.g. from ``build_meal_context``.
+        stream (bool): Whether tokens should be streamed back as they are generated.
+
+    Returns:
+        dict: OpenAI-compatible chat completion payload.
+    """
+    return {
         "model": "llama-3.2-1b-instruct",
         "messages": [
             {
                 "role": "system",
                 "content": (
                     "You must answer strictly only the information provided in the meals knowledge database "
-                    "and from the user profile details in the query. Do not use external knowledge, make assumptions, "
+                    "and from the user profile details in the user's message. Do not use external knowledge, make assumptions, "
                     "or generate results outside the database. If the information is not available, respond with: "
                     "'Information not available in the database.'\n\n"
-                    f"Meals knowledge database: {knowledge_db}\n"
-                    f"User details: {query}"
+                    f"Meals knowledge database:\n{knowledge_db}"
                 )
             },
             {"role": "user", "content": query}
         ],
         "temperature": 0.5,
         "max_tokens":200,  # Adjust this based on your needs
-        "stream": False
+        "stream": stream
     }
+
+
+def get_query_from_lm_studio(query,knowledge_db,session=None):
+    import requests
+
+    # Reuse the pooled LM Studio connection
+    session = session or get_lm_studio_session()
+
+    payload = build_lm_studio_payload(query, knowledge_db)
     headers = {"Content-Type": "application/json"}
-    response = requests.post(lm_studio_url, json=payload, headers=headers)
 
     try:
-        response = requests.post(lm_studio_url, json=payload, headers=headers)
+        response = session.post(LM_STUDIO_URL, json=payload, headers=headers)
         response.raise_for_status()  # Raise HTTP errors if any
         return response.json()["choices"][0]["message"]["content"]
     except requests.exceptions.RequestException as e:
         raise Exception(f"Error from LM Studio: {e}")
 
 
+def stream_query_from_lm_studio(query, knowledge_db, session=None, metrics=None):
+    """
+    Streams the LM Studio answer token by token.
+
+    Args:
+        query (str): Optimized user query with the user profile details.
+        knowledge_db (str): Retrieved meals used as context.
+        session (requests.Session): Session to use instead of the shared one.
+        metrics (dict): Filled with ``time_to_first_token`` and ``total_time``
+            in seconds, and the number of streamed ``chunks``.
+
+    Yields:
+        str: Text fragments in the order they are generated.
+    """
+    import requests
+
+    session = session or get_lm_studio_session()
+    metrics = {} if metrics is None else metrics
+
+    payload = build_lm_studio_payload(query, knowledge_db, stream=True)
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+
+    started = time.perf_counter()
+    metrics["chunks"] = 0
+    try:
+        with session.post(LM_STUDIO_URL, json=payload, headers=headers, stream=True) as response:
+            response.raise_for_status()
+
+            # Server-sent events: one "data: {json}" line per chunk, "data: [DONE]" at the end
+            for raw_line in response.iter_lines():
+                line = raw_line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                content = delta.get("content")
+                if not content:
+                    continue
+
+                if "time_to_first_token" not in metrics:
+                    metrics["time_to_first_token"] = time.perf_counter() - started
+                    logger.info("LM Studio time to first token: %.3fs", metrics["time_to_first_token"])
+                metrics["chunks"] += 1
+                yield content
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Error from LM Studio: {e}")
+    finally:
+        metrics["total_time"] = time.perf_counter() - started
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from embedding_cache import get_encoder
+from main_system import encode_user_query, profile_query_data, recommend_meals_async, retrieve_meals
+from meal_planner import parse_plan_request
+from recommend_meal import get_lm_studio_session, stream_query_from_lm_studio
+from response_cache import SemanticResponseCache
+from search_backend import get_search_backend
+from tracing import tracer
+from user_profile import add_dictionary_to_mongo, get_profile_repository
+
+
+# Appended to a streamed answer when generation fails after the response has started
+STREAM_ERROR_MARKER = "\n\n[error] "
+
+
+def hit_to_dict(hit):
+    """
+    Converts a search hit into a JSON-serializable dictionary.
+
+    Args:
+        hit (MealHit | ScoredPoint): Search result.
+
+    Returns:
+        dict: The hit ID, score and payload.
+    """
+    return {"id": str(hit.id), "score": hit.score, "payload": hit.payload}
+
+
+def parse_recommendation_request(body):
+    """
+    Validates the JSON body of a recommendation request.
+
+    Args:
+        body (dict): Request body with ``profile`` and ``query``.
+
+    Returns:
+        tuple[dict, str]: The full profile and the query.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object.")
+
+    profile = body.get("profile")
+    query = body.get("query")
+    if not isinstance(profile, dict):
+        raise ValueError("'profile' must be an object.")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError("'query' must be a non-empty string.")
+
+    for field in ("weight_kg", "height_cm"):
+        value = profile.get(field)
+        if not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"'profile.{field}' must be a positive number.")
+    profile.setdefault("dietary_restrictions", None)
+    profile.setdefault("dietary_preferences", None)
+
+    return profile, query.strip()
+
+
+async def read_recommendation_request(request):
+    """
+    Reads a recommendation request whose profile may be given by ``user_id``.
+
+    Stored profiles are served from the repository cache, and MongoDB is only
+    read on a worker thread when the profile is not cached.
+
+    Args:
+        request (web.Request): Request with ``query`` and either ``profile`` or ``user_id``.
+
+    Returns:
+        tuple[dict, str]: The full profile and the query.
+    """
+    body = await request.json()
+    if isinstance(body, dict) and "profile" not in body and "user_id" in body:
+        profiles = request.app["profiles"]
+        profile = profiles.cached(body["user_id"])
+        if profile is None:
+            profile = await asyncio.get_running_loop().run_in_executor(None, profiles.get, body["user_id"])
+        if profile is None:
+            raise ValueError(f"No profile with user_id {body['user_id']!r}.")
+        body = dict(body, profile=profile)
+    return parse_recommendation_request(body)
+
+
+async def handle_recommend(request):
+    app = request.app
+    try:
+        profile, query = await read_recommendation_request(request)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    loop = asyncio.get_running_loop()
+
+    if request.query.get("save_profile") == "true":
+        result = await loop.run_in_executor(
+            None, add_dictionary_to_mongo, "Food_recommendation", "user_profile", dict(profile)
+        )
+        if "error" in result:
+            return web.json_response(result, status=502)
+
+    async with app["limiter"]:
+        try:
+            recommendation = await recommend_meals_async(
+                profile_query_data(profile), query, app["encoder"], app["backend"],
+                cache=app["response_cache"],
+            )
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=502)
+
+    return web.json_response({
+        "answer": recommendation["answer"],
+        "hits": [hit_to_dict(hit) for hit in recommendation["hits"]],
+    })
+
+
+async def handle_recommend_stream(request):
+    app = request.app
+    try:
+        profile, query = await read_recommendation_request(request)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    loop = asyncio.get_running_loop()
+
+    user_data = profile_query_data(profile)
+    cache = app["response_cache"]
+
+    if parse_plan_request(query):
+        # Plans are generated per meal slot concurrently, so the whole answer is sent at once
+        async with app["limiter"]:
+            try:
+                recommendation = await recommend_meals_async(
+                    user_data, query, app["encoder"], app["backend"], cache=cache
+                )
+            except Exception as e:
+                return web.json_response({"error": str(e)}, status=502)
+        response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+        await response.prepare(request)
+        await response.write(recommendation["answer"].encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async with app["limiter"]:
+        try:
+            encoded_query = await loop.run_in_executor(None, encode_user_query, user_data, query, app["encoder"])
+            constraints = encoded_query[2]
+            cached = cache.get(encoded_query[1], user_data, constraints)
+            tracer.increment("response_cache_total", result="miss" if cached is None else "hit")
+            if cached is None:
+                user_info, meals, hits = await loop.run_in_executor(
+                    None,
+                    lambda: retrieve_meals(
+                        user_data, query, app["encoder"], app["backend"], encoded_query=encoded_query
+                    ),
+                )
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=502)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+        await response.prepare(request)
+
+        if cached is not None:
+            await response.write(cached["answer"].encode("utf-8"))
+            await response.write_eof()
+            return response
+
+        # Pull tokens from the blocking stream on a worker thread and forward them as they arrive
+        metrics = {}
+        tokens = stream_query_from_lm_studio(user_info, meals, metrics=metrics)
+        answer = []
+        error = None
+        pending = None
+        try:
+            while True:
+                # Shielded so a client disconnect cancels this handler but not the running next()
+                pending = loop.run_in_executor(None, next, tokens, None)
+                try:
+                    token = await asyncio.shield(pending)
+                except Exception as e:
+                    error = e
+                    break
+                finally:
+                    if pending.done():
+                        pending = None
+                if token is None:
+                    break
+                answer.append(token)
+                await response.write(token.encode("utf-8"))
+        finally:
+            if pending is not None:
+                # Closing the generator while next() still runs on its thread would fail
+                await asyncio.gather(pending, return_exceptions=True)
+            tokens.close()
+            # The stream runs across executor threads, so it is timed from its own metrics instead of a span
+            if "time_to_first_token" in metrics:
+                tracer.observe("llm_time_to_first_token_seconds", metrics["time_to_first_token"])
+            if "total_time" in metrics:
+                tracer.observe("stage_duration_seconds", metrics["total_time"], stage="llm_stream")
+
+        if error is not None:
+            # The 200 status is already sent, so the failure is reported at the end of the body
+            tracer.increment("stage_errors_total", stage="llm_stream")
+            await response.write(f"{STREAM_ERROR_MARKER}{error}\n".encode("utf-8"))
+            await response.write_eof()
+            return response
+
+        cache.put(encoded_query[1], user_data, {"answer": "".join(answer), "hits": hits}, constraints)
+
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    return web.json_response({"status": "ok"})
+
+
+async def handle_metrics(request):
+    # Prometheus text by default, ?format=json for counters, histogram summaries and recent spans
+    if request.query.get("format") == "json":
+        return web.Response(text=tracer.to_json(), content_type="application/json")
+    return web.Response(text=tracer.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+@web.middleware
+async def request_metrics(request, handler):
+    """
+    Counts requests and records their latency per route and status.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = request.match_info.route.resource
+        path = route.canonical if route is not None else "unmatched"
+        tracer.increment("http_requests_total", path=path, status=status)
+        tracer.observe("http_request_duration_seconds", time.perf_counter() - started, path=path)
+
+
+async def warm_up(app):
+    """
+    Loads the encoder and opens the pooled clients before serving requests.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=app["max_concurrency"]))
+
+    encoder = get_encoder("all-MiniLM-L6-v2")
+    # Load the transformer weights now instead of on the first cache miss
+    await loop.run_in_executor(None, lambda: encoder.model)
+
+    app["encoder"] = encoder
+    app["backend"] = await loop.run_in_executor(None, get_search_backend)
+    app["limiter"] = asyncio.Semaphore(app["max_concurrency"])
+    app["response_cache"] = SemanticResponseCache()
+
+    app["profiles"] = get_profile_repository("Food_recommendation", "user_profile")
+    get_lm_studio_session(app["max_concurrency"])
+
+
+def create_app(max_concurrency=8):
+    """
+    Builds the recommendation HTTP API.
+
+    A streamed answer whose generation fails after the first bytes were sent
+    ends with ``STREAM_ERROR_MARKER`` followed by the error, since the status
+    code can no longer change.
+
+    Args:
+        max_concurrency (int): Maximum number of recommendations processed at once.
+
+    Returns:
+        web.Application: Application serving ``POST /recommend``, ``POST /recommend/stream``,
+        ``GET /health`` and ``GET /metrics``.
+    """
+    app = web.Application(middlewares=[request_metrics])
+    app["max_concurrency"] = max_concurrency
+    app.on_startup.append(warm_up)
+    app.router.add_post("/recommend", handle_recommend)
+    app.router.add_post("/recommend/stream", handle_recommend_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run the meal recommendation service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.max_concurrency), host=args.host, port=args.port)
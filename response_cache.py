@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+
+import numpy as np
+
+from meal_ingestion import catalogue_version
+
+
+def _normalize_text(value):
+    if not value:
+        return ""
+    return ",".join(sorted(part.strip() for part in str(value).lower().split(",") if part.strip()))
+
+
+def profile_bucket(user_data, weight_step=5.0, height_step=5.0):
+    """
+    Maps a user profile to the bucket within which cached answers are shared.
+
+    Args:
+        user_data (dict): Weight, height, dietary restrictions and preferences.
+        weight_step (float): Width of a weight range in kilograms.
+        height_step (float): Width of a height range in centimeters.
+
+    Returns:
+        tuple: Weight range, height range, restrictions and preferences.
+    """
+    return (
+        int(user_data["weight_kg"] // weight_step),
+        int(user_data["height_cm"] // height_step),
+        _normalize_text(user_data.get("dietary_restrictions")),
+        _normalize_text(user_data.get("dietary_preferences")),
+    )
+
+
+class SemanticResponseCache:
+    """
+    Caches recommendation results for near-identical queries.
+
+    An entry is reused when the profile falls in the same bucket, the query
+    carries the same nutrient constraints, asks for the same plan size and the cosine similarity of the
+    query embeddings reaches ``threshold``. Entries expire after ``ttl``
+    seconds, the least recently used entry is evicted beyond
+    ``max_entries``, and everything is dropped when the meal catalogue
+    version changes.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600.0, max_entries=1000, version_source=catalogue_version):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_source = version_source
+
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._ids = count()
+        self._version = version_source()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_version(self):
+        version = self.version_source()
+        if version != self._version:
+            self._version = version
+            self._entries.clear()
+            self._buckets.clear()
+
+    def _remove(self, entry_id):
+        bucket, _, _, _ = self._entries.pop(entry_id)
+        self._buckets[bucket].remove(entry_id)
+        if not self._buckets[bucket]:
+            del self._buckets[bucket]
+
+    def invalidate(self):
+        """
+        Drops every cached entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get(self, query_vector, user_data, constraints=(), plan=None):
+        """
+        Looks up the result of a sufficiently similar earlier query.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            user_data (dict): Profile used for the query.
+            constraints (list[NutrientConstraint]): Nutrient constraints of the query.
+            plan (tuple[int, int]): Days and meals per day of a plan request, see ``parse_plan_request``.
+
+        Returns:
+            object | None: The cached result, or None on a miss.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        bucket = (profile_bucket(user_data), tuple(constraints), plan)
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_version()
+
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(bucket, ())):
+                _, vector, value, expires = self._entries[entry_id]
+                if expires <= now:
+                    self._remove(entry_id)
+                    continue
+                score = float(vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                return None
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][2]
+
+    def put(self, query_vector, user_data, value, constraints=(), plan=None):
+        """
+        Stores the result of a query.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            user_data (dict): Profile used for the query.
+            value (object): Result to return for similar queries.
+            constraints (list[NutrientConstraint]): Nutrient constraints of the query.
+            plan (tuple[int, int]): Days and meals per day of a plan request, see ``parse_plan_request``.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        bucket = (profile_bucket(user_data), tuple(constraints), plan)
+
+        with self._lock:
+            self._check_version()
+
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (bucket, query, value, time.monotonic() + self.ttl)
+            self._buckets.setdefault(bucket, []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
@@ -0,0 +1,571 @@
+import asyncio
+import json
+import os
+import struct
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+from lexical_index import BM25Index, meal_lexical_text, reciprocal_rank_fusion
+from meal_catalogue import MealCatalogue
+from nutrients import (
+    NUTRIENT_FIELDS, applicable_constraints, constraint_mask, nutrient_columns, qdrant_nutrient_filter, relax_constraints,
+)
+from quantization import QuantizedIndex
+
+
+# Search result with the same attributes main_system reads from Qdrant hits
+MealHit = namedtuple("MealHit", ["id", "score", "payload"])
+
+# FAISS flat index fourcc codes and their metric names
+FLAT_INDEX_METRICS = {b"IxF2": "l2", b"IxFI": "inner_product"}
+
+
+def read_flat_index_header(index_path):
+    """
+    Parses the header of a FAISS flat index written by ``faiss.write_index``.
+
+    Args:
+        index_path (str): Path to an ``IndexFlatL2``/``IndexFlatIP`` file.
+
+    Returns:
+        tuple: Vector dimension, vector count, metric name and byte offset of the float32 data.
+    """
+    with open(index_path, "rb") as file:
+        header = file.read(45)
+
+    fourcc = header[:4]
+    if fourcc not in FLAT_INDEX_METRICS:
+        raise ValueError(f"Unsupported index type {fourcc!r} in {index_path}")
+
+    # fourcc, d, ntotal, two unused int64 fields, is_trained, metric_type, float count
+    dimension, count = struct.unpack_from("<iq", header, 4)
+    (float_count,) = struct.unpack_from("<q", header, 37)
+    if float_count != dimension * count:
+        raise ValueError(f"Corrupt index {index_path}: expected {dimension * count} floats, found {float_count}")
+
+    return dimension, count, FLAT_INDEX_METRICS[fourcc], 45
+
+
+def write_flat_index(index_path, batches, dimension):
+    """
+    Writes vectors as a FAISS ``IndexFlatL2`` file readable by ``LocalIndexBackend``.
+
+    Batches are written as they arrive and the vector count is filled in at
+    the end, so the vectors never have to be held in memory at once.
+
+    Args:
+        index_path (str): Destination file.
+        batches (Iterable[numpy.ndarray]): float32 arrays of shape (rows, dimension).
+        dimension (int): Size of the vectors.
+
+    Returns:
+        int: Number of vectors written.
+    """
+    count = 0
+    with open(index_path, "wb") as file:
+        file.write(b"\0" * 45)
+        for batch in batches:
+            batch = np.ascontiguousarray(batch, dtype="<f4")
+            if batch.ndim != 2 or batch.shape[1] != dimension:
+                raise ValueError(f"Expected vectors of dimension {dimension}, got shape {batch.shape}")
+            file.write(batch.tobytes())
+            count += len(batch)
+
+        # Same layout as faiss.write_index: unused fields hold 1 << 20, is_trained and metric_type (L2) are 1
+        file.seek(0)
+        file.write(b"IxF2" + struct.pack("<iqqqbiq", dimension, count, 1 << 20, 1 << 20, 1, 1, dimension * count))
+    return count
+
+
+class LocalIndexBackend:
+    """
+    In-process meal search over the shipped ``vector_database.index``.
+
+    The vectors are memory-mapped read-only, so worker processes share the
+    same pages through the OS cache. Row ``i`` of the index is described by
+    row ``i`` of ``vector_database.catalogue``, whose nutrient matrix is
+    memory-mapped as well and used directly for pre-filtering. Without a
+    catalogue file, ``metadata.json`` is parsed instead.
+
+    With ``quantization`` set to "int8" or "binary", candidates are ranked on
+    compressed codes held in memory and only the top ``limit * oversampling``
+    are rescored against the full-precision vectors.
+    """
+
+    def __init__(self, index_path="vector_database.index", metadata_path="metadata.json", quantization=None, oversampling=4.0, catalogue_path=None):
+        dimension, count, self.metric, offset = read_flat_index_header(index_path)
+        self.vectors = np.memmap(index_path, dtype=np.float32, mode="r", offset=offset, shape=(count, dimension))
+
+        catalogue_path = catalogue_path or os.path.splitext(index_path)[0] + ".catalogue"
+        if os.path.exists(catalogue_path):
+            metadata_path = catalogue_path
+            self.metadata = MealCatalogue(catalogue_path)
+            self.nutrients = self.metadata.nutrients
+        else:
+            with open(metadata_path, "r") as file:
+                self.metadata = json.load(file)
+            self.nutrients = nutrient_columns(self.metadata)
+        if len(self.metadata) != count:
+            raise ValueError(f"{metadata_path} has {len(self.metadata)} entries but the index has {count} vectors")
+
+        self._norms = None
+        self._nutrient_fields = None
+
+        self.quantized = None
+        if quantization:
+            self.quantized = QuantizedIndex(self.vectors, quantization, oversampling, codes_path=index_path)
+
+    def applicable_constraints(self, constraints):
+        """
+        Drops the constraints on nutrients that no meal in the index carries.
+
+        Args:
+            constraints (list[NutrientConstraint]): Constraints found in a query.
+
+        Returns:
+            list[NutrientConstraint]: Constraints the pre-filter can evaluate.
+        """
+        if not constraints:
+            return []
+        if self._nutrient_fields is None:
+            known = ~np.isnan(self.nutrients).all(axis=0)
+            self._nutrient_fields = frozenset(field for field, present in zip(NUTRIENT_FIELDS, known) if present)
+        return applicable_constraints(constraints, self._nutrient_fields)
+
+    def _vector_norms(self):
+        if self._norms is None:
+            norms = np.linalg.norm(self.vectors, axis=1)
+            norms[norms == 0] = 1.0
+            self._norms = norms
+        return self._norms
+
+    def search(self, query_vector, limit=10, constraints=None, query_text=None):
+        """
+        Finds the meals closest to a query vector.
+
+        Rows are ranked by cosine similarity, like the Qdrant ``meals``
+        collection. For the normalized MiniLM vectors this is the same order
+        as the L2 distance the index was built with.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            limit (int): Maximum number of hits.
+            constraints (list[NutrientConstraint]): Nutrient constraints every hit must satisfy.
+            query_text (str): Raw query text; only used by ``HybridSearchBackend``.
+
+        Returns:
+            list[MealHit]: Hits ordered by decreasing score.
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        constraints = self.applicable_constraints(constraints)
+        rows = np.flatnonzero(constraint_mask(self.nutrients, constraints)) if constraints else None
+        if rows is not None and not rows.size and relax_constraints(constraints) != constraints:
+            # No meal is close to an approximate target, so only the hard bounds are kept
+            constraints = relax_constraints(constraints)
+            rows = np.flatnonzero(constraint_mask(self.nutrients, constraints)) if constraints else None
+
+        if self.quantized is not None:
+            top_rows, scores = self.quantized.search(query, limit, rows)
+            return [
+                MealHit(id=int(row), score=float(score), payload=self.metadata[row])
+                for row, score in zip(top_rows, scores)
+            ]
+
+        # Only score the rows that pass the nutrient pre-filter
+        if constraints:
+            scores = (self.vectors[rows] @ query) / (self._vector_norms()[rows] * query_norm)
+        else:
+            scores = (self.vectors @ query) / (self._vector_norms() * query_norm)
+
+        return self._top_hits(scores, rows, limit)
+
+    def search_batch(self, query_vectors, limit=10, constraints=None, query_texts=None):
+        """
+        Runs several searches, scoring all unconstrained queries in one matrix
+        product when the index is not quantized.
+
+        Args:
+            query_vectors (list | numpy.ndarray): Encoded queries, one per row.
+            limit (int): Maximum number of hits per query.
+            constraints (list[list[NutrientConstraint]]): Constraints of each query, if any.
+            query_texts (list[str]): Raw query texts; only used by ``HybridSearchBackend``.
+
+        Returns:
+            list[list[MealHit]]: Hits of each query, in input order.
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        constraints = [self.applicable_constraints(query_constraints) for query_constraints in constraints or [None] * len(queries)]
+        results = [None] * len(queries)
+
+        plain = [index for index, query_constraints in enumerate(constraints) if not query_constraints]
+        if plain and self.quantized is None:
+            block = queries[plain]
+            block_norms = np.linalg.norm(block, axis=1)
+            block_norms[block_norms == 0] = 1.0
+            scores = (self.vectors @ block.T) / np.outer(self._vector_norms(), block_norms)
+            for column, index in enumerate(plain):
+                results[index] = self._top_hits(scores[:, column], None, limit)
+
+        for index, query_constraints in enumerate(constraints):
+            if results[index] is None:
+                results[index] = self.search(queries[index], limit, query_constraints)
+        return results
+
+    def retrieve(self, ids):
+        """
+        Looks up meals by ID.
+
+        Args:
+            ids (list[int]): Row numbers of the meals.
+
+        Returns:
+            list[MealHit]: Meals with a score of 0, in input order.
+        """
+        return [MealHit(id=int(row), score=0.0, payload=self.metadata[int(row)]) for row in ids]
+
+    def lexical_index(self):
+        """
+        Builds a BM25 index over the meal and restaurant names of the metadata.
+
+        Returns:
+            BM25Index: Index whose document IDs are the row numbers.
+        """
+        index = BM25Index()
+        for row, payload in enumerate(self.metadata):
+            index.add(row, meal_lexical_text(payload))
+        return index
+
+    def _top_hits(self, scores, rows, limit):
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+
+        hits = []
+        for position in top:
+            row = int(position if rows is None else rows[position])
+            hits.append(MealHit(id=row, score=float(scores[position]), payload=self.metadata[row]))
+        return hits
+
+
+class QdrantBackend:
+    """
+    Meal search against a Qdrant collection over HTTP.
+
+    When the collection was created with quantization, ``oversampling``
+    controls how many quantized candidates Qdrant rescores per hit.
+    """
+
+    def __init__(self, url="http://localhost:6338", collection_name="meals", client=None, oversampling=None):
+        # The async client is only opened for backends that own their connection
+        self.url = url if client is None else None
+        if client is None:
+            from qdrant_client import QdrantClient
+
+            client = QdrantClient(url=url)
+        self.client = client
+        self.collection_name = collection_name
+        self.oversampling = oversampling
+        # One async client per event loop, since its connections are bound to the loop that opened them
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._nutrient_fields = {}
+
+    def applicable_constraints(self, constraints):
+        """
+        Drops the constraints on nutrients that no meal in the collection carries.
+
+        Whether a nutrient is present is counted once per field and then
+        remembered for the lifetime of the backend.
+
+        Args:
+            constraints (list[NutrientConstraint]): Constraints found in a query.
+
+        Returns:
+            list[NutrientConstraint]: Constraints the payload filter can evaluate.
+        """
+        if not constraints:
+            return []
+
+        from qdrant_client import models
+
+        for field in {constraint.field for constraint in constraints} - set(self._nutrient_fields):
+            key = models.PayloadField(key=f"nutrients.{field}")
+            self._nutrient_fields[field] = self.client.count(
+                collection_name=self.collection_name,
+                count_filter=models.Filter(must_not=[models.IsEmptyCondition(is_empty=key)]),
+                exact=False,
+            ).count > 0
+        return applicable_constraints(constraints, {field for field, present in self._nutrient_fields.items() if present})
+
+    def _search_params(self):
+        # Rescore the oversampled quantized candidates with the original vectors
+        if self.oversampling is None:
+            return None
+
+        from qdrant_client import models
+
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        )
+
+    def search(self, query_vector, limit=10, constraints=None, query_text=None):
+        """
+        Finds the meals closest to a query vector.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            limit (int): Maximum number of hits.
+            constraints (list[NutrientConstraint]): Nutrient constraints every hit must satisfy.
+            query_text (str): Raw query text; only used by ``HybridSearchBackend``.
+
+        Returns:
+            list[ScoredPoint]: Hits ordered by decreasing score.
+        """
+        constraints = self.applicable_constraints(constraints)
+        hits = self._search(query_vector, limit, constraints)
+        if not hits and relax_constraints(constraints) != constraints:
+            # No meal is close to an approximate target, so only the hard bounds are kept
+            hits = self._search(query_vector, limit, relax_constraints(constraints))
+        return hits
+
+    def _search(self, query_vector, limit, constraints):
+        return self.client.search(
+            collection_name=self.collection_name,
+            query_vector=list(map(float, query_vector)),
+            query_filter=qdrant_nutrient_filter(constraints),
+            search_params=self._search_params(),
+            limit=limit,
+        )
+
+    async def search_async(self, query_vector, limit=10, constraints=None, query_text=None):
+        """
+        Finds the closest meals on the asynchronous Qdrant client.
+
+        Several of these can be awaited together without a thread per search.
+        The async client connects to ``url``; backends built around an
+        existing client search on that client in a worker thread instead.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            limit (int): Maximum number of hits.
+            constraints (list[NutrientConstraint]): Nutrient constraints every hit must satisfy.
+            query_text (str): Raw query text; only used by ``HybridSearchBackend``.
+
+        Returns:
+            list[ScoredPoint]: Hits ordered by decreasing score.
+        """
+        if self.url is None:
+            return await asyncio.to_thread(self.search, query_vector, limit, constraints, query_text)
+
+        # Nutrient presence is counted on the sync client, only until every field is known
+        if any(constraint.field not in self._nutrient_fields for constraint in constraints or ()):
+            constraints = await asyncio.to_thread(self.applicable_constraints, constraints)
+        else:
+            constraints = self.applicable_constraints(constraints)
+
+        loop = asyncio.get_running_loop()
+        async_client = self._async_clients.get(loop)
+        if async_client is None:
+            from qdrant_client import AsyncQdrantClient
+
+            async_client = self._async_clients[loop] = AsyncQdrantClient(url=self.url)
+
+        async def search(query_constraints):
+            return await async_client.search(
+                collection_name=self.collection_name,
+                query_vector=list(map(float, query_vector)),
+                query_filter=qdrant_nutrient_filter(query_constraints),
+                search_params=self._search_params(),
+                limit=limit,
+            )
+
+        hits = await search(constraints)
+        if not hits and relax_constraints(constraints) != constraints:
+            hits = await search(relax_constraints(constraints))
+        return hits
+
+    def search_batch(self, query_vectors, limit=10, constraints=None, query_texts=None):
+        """
+        Runs several searches in a single Qdrant request.
+
+        Args:
+            query_vectors (list | numpy.ndarray): Encoded queries, one per row.
+            limit (int): Maximum number of hits per query.
+            constraints (list[list[NutrientConstraint]]): Constraints of each query, if any.
+            query_texts (list[str]): Raw query texts; only used by ``HybridSearchBackend``.
+
+        Returns:
+            list[list[ScoredPoint]]: Hits of each query, in input order.
+        """
+        from qdrant_client import models
+
+        constraints = [self.applicable_constraints(query_constraints) for query_constraints in constraints or [None] * len(query_vectors)]
+        results = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=list(map(float, query_vector)),
+                    filter=qdrant_nutrient_filter(query_constraints),
+                    params=self._search_params(),
+                    limit=limit,
+                    with_payload=True,
+                )
+                for query_vector, query_constraints in zip(query_vectors, constraints)
+            ],
+        )
+
+        # Queries whose approximate targets matched nothing are searched again with the hard bounds
+        for index, (hits, query_constraints) in enumerate(zip(results, constraints)):
+            if not hits and relax_constraints(query_constraints) != query_constraints:
+                results[index] = self._search(query_vectors[index], limit, relax_constraints(query_constraints))
+        return results
+
+    def retrieve(self, ids):
+        """
+        Looks up meals by point ID.
+
+        Args:
+            ids (list[str]): Point IDs of the meals.
+
+        Returns:
+            list[Record]: Meals that still exist, with their payloads.
+        """
+        return self.client.retrieve(collection_name=self.collection_name, ids=list(ids), with_payload=True)
+
+    def lexical_index(self, path="meal_lexical_index.json"):
+        """
+        Loads the BM25 index written by the meal ingestion.
+
+        Args:
+            path (str): Index file saved by ``Vector_db_meals.py``.
+
+        Returns:
+            BM25Index: Index whose document IDs are the point IDs.
+        """
+        return BM25Index.load(path)
+
+
+class HybridSearchBackend:
+    """
+    Combines dense vector search with BM25 over meal and restaurant names.
+
+    Both rankings are fetched ``candidate_factor`` times deeper than the
+    requested limit and fused with reciprocal rank fusion, so exact menu and
+    restaurant names rank highly even when their embeddings are not the
+    closest.
+    """
+
+    def __init__(self, backend, lexical_index=None, candidate_factor=3, rrf_k=60):
+        self.backend = backend
+        self.lexical = lexical_index if lexical_index is not None else backend.lexical_index()
+        self.candidate_factor = candidate_factor
+        self.rrf_k = rrf_k
+
+    def applicable_constraints(self, constraints):
+        return self.backend.applicable_constraints(constraints)
+
+    def search(self, query_vector, limit=10, constraints=None, query_text=None):
+        """
+        Finds meals by fused vector and lexical rank.
+
+        Args:
+            query_vector (list[float] | numpy.ndarray): Encoded query.
+            limit (int): Maximum number of hits.
+            constraints (list[NutrientConstraint]): Nutrient constraints every hit must satisfy.
+            query_text (str): Raw query text matched against meal and restaurant names.
+
+        Returns:
+            list[MealHit]: Hits ordered by decreasing fused score.
+        """
+        dense = self.backend.search(query_vector, limit * self.candidate_factor, constraints)
+        return self._fuse(dense, limit, constraints, query_text)
+
+    def search_batch(self, query_vectors, limit=10, constraints=None, query_texts=None):
+        """
+        Runs several hybrid searches with one batched vector search.
+
+        Args:
+            query_vectors (list | numpy.ndarray): Encoded queries, one per row.
+            limit (int): Maximum number of hits per query.
+            constraints (list[list[NutrientConstraint]]): Constraints of each query, if any.
+            query_texts (list[str]): Raw query texts matched against meal and restaurant names.
+
+        Returns:
+            list[list[MealHit]]: Hits of each query, in input order.
+        """
+        constraints = constraints or [None] * len(query_vectors)
+        query_texts = query_texts or [None] * len(query_vectors)
+        dense_results = self.backend.search_batch(query_vectors, limit * self.candidate_factor, constraints)
+        return [
+            self._fuse(dense, limit, query_constraints, query_text)
+            for dense, query_constraints, query_text in zip(dense_results, constraints, query_texts)
+        ]
+
+    def _fuse(self, dense, limit, constraints, query_text):
+        if not query_text:
+            return [MealHit(id=hit.id, score=hit.score, payload=hit.payload) for hit in dense[:limit]]
+
+        payloads = {hit.id: hit.payload for hit in dense}
+        lexical = [doc_id for doc_id, _ in self.lexical.search(query_text, limit * self.candidate_factor)]
+
+        # Lexical-only matches still have to be hydrated and checked against the nutrient constraints
+        missing = [doc_id for doc_id in lexical if doc_id not in payloads]
+        constraints = self.applicable_constraints(constraints)
+        if missing:
+            retrieved = self.backend.retrieve(missing)
+            if constraints:
+                keep = constraint_mask(nutrient_columns([record.payload for record in retrieved]), constraints)
+                retrieved = [record for record, passed in zip(retrieved, keep) if passed]
+            payloads.update((record.id, record.payload) for record in retrieved)
+
+        fused = reciprocal_rank_fusion([[hit.id for hit in dense], lexical], k=self.rrf_k)
+        hits = [
+            MealHit(id=doc_id, score=score, payload=payloads[doc_id])
+            for doc_id, score in fused
+            if doc_id in payloads
+        ]
+        return hits[:limit]
+
+
+SEARCH_BACKENDS = {
+    "local": LocalIndexBackend,
+    "qdrant": QdrantBackend,
+}
+
+
+def get_search_backend(name=None, hybrid=None, **kwargs):
+    """
+    Creates the configured meal search backend.
+
+    Args:
+        name (str): "qdrant" or "local". Defaults to the ``MEAL_SEARCH_BACKEND``
+            environment variable, or "qdrant" when it is unset.
+        hybrid (bool): Whether to fuse vector search with BM25 over meal names.
+            Defaults to the ``MEAL_SEARCH_HYBRID`` environment variable ("1" enables it).
+        **kwargs: Arguments passed to the backend constructor. ``quantization``
+            (local only) and ``oversampling`` default to the ``MEAL_SEARCH_QUANTIZATION``
+            and ``MEAL_SEARCH_OVERSAMPLING`` environment variables.
+
+    Returns:
+        LocalIndexBackend | QdrantBackend | HybridSearchBackend: Backend exposing
+        ``search(query_vector, limit, constraints, query_text)``.
+    """
+    name = (name or os.environ.get("MEAL_SEARCH_BACKEND", "qdrant")).lower()
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend '{name}'. Choose one of: {', '.join(SEARCH_BACKENDS)}")
+
+    # Quantized search with rescoring is configured through the environment as well
+    if name == "local" and os.environ.get("MEAL_SEARCH_QUANTIZATION"):
+        kwargs.setdefault("quantization", os.environ["MEAL_SEARCH_QUANTIZATION"])
+    if os.environ.get("MEAL_SEARCH_OVERSAMPLING"):
+        kwargs.setdefault("oversampling", float(os.environ["MEAL_SEARCH_OVERSAMPLING"]))
+
+    backend = SEARCH_BACKENDS[name](**kwargs)
+
+    if hybrid is None:
+        hybrid = os.environ.get("MEAL_SEARCH_HYBRID", "0") == "1"
+    return HybridSearchBackend(backend) if hybrid else backend
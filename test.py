@@ -1,41 +1,10 @@
 from qdrant_client import models, QdrantClient
-from sentence_transformers import SentenceTransformer
-import json
+from embedding_cache import get_encoder
+from meal_ingestion import build_meal_description, build_meal_payload
+from meal_loader import batched, iter_products
 
-# Initialize the sentence transformer model
-encoder = SentenceTransformer("all-MiniLM-L6-v2")
-
-# Load the JSON data
-with open("Food_recommendation.meal_collection.json", "r") as file:
-    data = json.load(file)
-
-# Prepare documents and payloads
-documents = []
-payloads = []
-for restaurant in data:
-    restaurant_name = restaurant['restaurant_name']
-    for product in restaurant['products']:
-        # Create a descriptive string for each product
-        description = (
-            f"{product['name']} with {product['calories']} calories, "
-            f"{product['total fat']} fat, {product['saturated fat']} saturated fat, " 
-            f"{product['cholesterol']} cholesterol, {product['total carb']} carbs, "
-            f"{product['dietary fibre']} dietary fibre, {product['sugar']} sugar, "
-            f"{product['protein']} protein "
-        )
-        documents.append(description)
-        payloads.append({
-            "restaurant_name": restaurant_name,
-            "name": product["name"],
-            "calories": product["calories"],
-            "total_fat": product["total fat"],
-            "saturated_fat":product["saturated fat"],
-            "cholesterol":product["cholesterol"],
-            "total_carb":product["total carb"],
-            "dietary_fibre":product["dietary fibre"],
-            "sugar":product["sugar"],
-            "protein":product["protein"]
-        })
+# Initialize the cached sentence transformer encoder
+encoder = get_encoder("all-MiniLM-L6-v2")
 
 # Initialize the Qdrant client
 client = QdrantClient(":memory:")
@@ -49,18 +18,26 @@ client.create_collection(
     ),
 )
 
-# Upload points to the Qdrant collection
-client.upload_points(
-    collection_name="meals",
-    points=[
-        models.PointStruct(
-            id=idx,
-            vector=encoder.encode(doc).tolist(),
-            payload=payload
-        )
-        for idx, (doc, payload) in enumerate(zip(documents, payloads))
-    ],
-)
+# Stream products from the JSON data and encode/upload them in fixed-size batches
+next_id = 0
+for batch in batched(iter_products("Food_recommendation.meal_collection.json"), 256):
+    documents = [build_meal_description(product) for _, product in batch]
+    payloads = [build_meal_payload(restaurant_name, product) for restaurant_name, product in batch]
+    document_vectors = encoder.encode(documents)
+
+    # Upload points to the Qdrant collection
+    client.upload_points(
+        collection_name="meals",
+        points=[
+            models.PointStruct(
+                id=next_id + offset,
+                vector=vector.tolist(),
+                payload=payload
+            )
+            for offset, (vector, payload) in enumerate(zip(document_vectors, payloads))
+        ],
+    )
+    next_id += len(batch)
 
 # Query the Qdrant collection
 query_vector = encoder.encode("Suggest a 3 meal plan for 7 days. Weight is 85 Kg, Height is 160 cm. I have cholesterol as well.").tolist()
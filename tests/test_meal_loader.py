@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from meal_loader import iter_json_array
+
+
+def write_json(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 64])
+def test_numbers_split_across_chunks(tmp_path, chunk_size):
+    path = write_json(tmp_path, "[12345, 678, 1.25, -3e2, 9]")
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == [12345, 678, 1.25, -300.0, 9]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 8, 1 << 16])
+def test_objects_and_literals_split_across_chunks(tmp_path, chunk_size):
+    elements = [{"name": "Toast", "calories": "350"}, [1, 2], "text, with ] inside", True, None, 0]
+    path = write_json(tmp_path, json.dumps(elements, indent=2))
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == elements
+
+
+def test_empty_array(tmp_path):
+    assert list(iter_json_array(write_json(tmp_path, " [ ] "), chunk_size=1)) == []
+
+
+def test_truncated_array_raises(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write_json(tmp_path, "[1, 2"), chunk_size=2))
+
+
+def test_not_an_array_raises(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write_json(tmp_path, '{"a": 1}')))
@@ -0,0 +1,72 @@
+import math
+from itertools import product
+
+import pytest
+
+from meal_planner import _product_grid, daily_targets, format_meal_plan, plan_slot_meals
+from search_backend import MealHit
+
+
+TARGETS = daily_targets(70, 175)
+SLOTS = ("breakfast", "lunch", "dinner")
+
+
+def metadata_row(name, calories, total_fat, total_carb, protein):
+    # Same fields and formatting as the rows of metadata.json, which carry no sugar, sodium or cholesterol
+    return {
+        "restaurant_name": "Diner",
+        "name": name,
+        "calories": str(calories),
+        "total_fat": f"{total_fat}% Daily Value",
+        "total_carb": f"{total_carb}g grams",
+        "protein": f"{protein}g grams",
+    }
+
+
+def balanced_slot_hits(per_slot=2):
+    calories = round(TARGETS["calories"] / 3)
+    slot_hits = {}
+    for position, slot in enumerate(SLOTS):
+        slot_hits[slot] = [
+            MealHit(f"{slot}-{index}", 1.0 - index / 100, metadata_row(f"{slot} {index}", calories, 25, 100, 30))
+            for index in range(per_slot)
+        ]
+    return slot_hits
+
+
+def test_metadata_rows_can_meet_targets():
+    plans = plan_slot_meals(balanced_slot_hits(), SLOTS, TARGETS, days=2)
+    assert [plan["meets_targets"] for plan in plans] == [True, True]
+    assert plans[0]["meals"] != plans[1]["meals"]
+    assert math.isnan(plans[0]["totals"]["sugar"])
+    assert "closest available" not in format_meal_plan(plans, TARGETS)
+
+
+def test_nutrient_missing_from_some_meals_does_not_meet_target():
+    slot_hits = balanced_slot_hits(per_slot=1)
+    for slot in SLOTS[1:]:
+        slot_hits[slot][0].payload["sugar"] = "5g"
+    plans = plan_slot_meals(slot_hits, SLOTS, TARGETS)
+    assert not plans[0]["meets_targets"]
+    assert math.isnan(plans[0]["totals"]["sugar"])
+    assert "closest available" in format_meal_plan(plans, TARGETS)
+
+
+@pytest.mark.parametrize("sizes", [[3], [2, 4], [3, 1, 2], [2, 0]])
+def test_product_grid_matches_itertools(sizes):
+    assert [tuple(row) for row in _product_grid(sizes)] == list(product(*map(range, sizes)))
+
+
+def test_same_meal_is_not_picked_twice_in_a_day():
+    calories = round(TARGETS["calories"] / 2)
+    shared = MealHit("shared", 1.0, metadata_row("Shared", calories, 25, 150, 30))
+    other = MealHit("other", 0.5, metadata_row("Other", calories - 100, 25, 150, 30))
+    plans = plan_slot_meals({"lunch": [shared], "dinner": [shared, other]}, ("lunch", "dinner"), TARGETS)
+    assert [meal["name"] for meal in plans[0]["meals"]] == ["Shared", "Other"]
+
+
+def test_days_do_not_repeat_slot_meals_until_candidates_run_out():
+    plans = plan_slot_meals(balanced_slot_hits(per_slot=2), SLOTS, TARGETS, days=3)
+    names = [tuple(meal["name"] for meal in plan["meals"]) for plan in plans]
+    assert len(plans) == 3
+    assert set(names[0]).isdisjoint(names[1])
@@ -0,0 +1,92 @@
+import pytest
+
+from nutrients import (
+    NutrientConstraint, constraint_mask, convert_nutrient_value, extract_nutrient_constraints,
+    find_nutrient_constraints, nutrient_columns, parse_nutrient_value,
+)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("I don't want more than 20g fat", NutrientConstraint("total_fat", "lte", 20 / 78 * 100)),
+    ("I do not want anything over 500 calories", NutrientConstraint("calories", "lte", 500.0)),
+    ("never more than 5g sugar", NutrientConstraint("sugar", "lte", 5.0)),
+    ("not under 20g protein", NutrientConstraint("protein", "gte", 20.0)),
+    ("burger with fat not over 20%", NutrientConstraint("total_fat", "lte", 20.0)),
+])
+def test_negated_comparison_is_flipped(query, expected):
+    assert extract_nutrient_constraints(query) == [expected]
+
+
+@pytest.mark.parametrize("query", ["I don't want 2000 calories", "not sugar free", "don't want no sugar"])
+def test_negated_target_is_dropped(query):
+    assert extract_nutrient_constraints(query) == []
+
+
+def test_negation_outside_the_constraint_is_ignored():
+    assert extract_nutrient_constraints("I don't like fish, under 500 calories") == [
+        NutrientConstraint("calories", "lt", 500.0)
+    ]
+    assert extract_nutrient_constraints("no more than 20g sugar") == [NutrientConstraint("sugar", "lte", 20.0)]
+
+
+def test_negated_constraint_span_includes_the_negation():
+    query = "i don't want more than 20g fat"
+    [(start, end, _)] = find_nutrient_constraints(query)
+    assert query[start:end] == "don't want more than 20g fat"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("65g grams", 65.0),
+    ("0% Daily Value", 0.0),
+    ("1.5g", 1.5),
+    ("240", 240.0),
+    (240, 240.0),
+    (None, None),
+    ("n/a", None),
+])
+def test_parse_nutrient_value(text, expected):
+    assert parse_nutrient_value(text) == expected
+
+
+@pytest.mark.parametrize("field, value, unit, expected", [
+    ("protein", 20.0, None, 20.0),
+    ("protein", 500.0, "mg", 0.5),
+    ("cholesterol", 0.3, "g", 300.0),
+    ("total_fat", 39.0, "g", 50.0),
+    ("total_fat", 10.0, "%", 10.0),
+    ("calories", 500.0, "kcal", 500.0),
+    ("protein", 20.0, "%", None),
+    ("protein", 20.0, "kcal", None),
+    ("calories", 500.0, "g", None),
+])
+def test_convert_nutrient_value(field, value, unit, expected):
+    converted = convert_nutrient_value(field, value, unit)
+    assert converted == (None if expected is None else pytest.approx(expected))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("under 500 calories", [("calories", "lt", 500.0)]),
+    ("calories at least 300", [("calories", "gte", 300.0)]),
+    ("at least 20g of protein", [("protein", "gte", 20.0)]),
+    ("burger with fat under 5%", [("total_fat", "lt", 5.0)]),
+    ("0 saturated fat meals", [("saturated_fat", "eq", 0.0)]),
+    ("2000 calories", [("calories", "about", 2000.0)]),
+    ("no sugar", [("sugar", "eq", 0.0)]),
+    ("sugar-free dessert", [("sugar", "eq", 0.0)]),
+    ("2000 calories under 15 fat", [("calories", "about", 2000.0), ("total_fat", "lt", 15.0)]),
+    ("protein over 20%", []),
+    ("high protein salad", []),
+])
+def test_extract_nutrient_constraints(query, expected):
+    assert extract_nutrient_constraints(query) == [NutrientConstraint(*constraint) for constraint in expected]
+
+
+def test_constraint_mask():
+    columns = nutrient_columns([
+        {"calories": "1900", "sugar": "5g"},
+        {"calories": "2300"},
+        {"calories": "450", "sugar": "0g"},
+    ])
+    assert constraint_mask(columns, [NutrientConstraint("calories", "about", 2000.0)]).tolist() == [True, False, False]
+    assert constraint_mask(columns, [NutrientConstraint("sugar", "eq", 0.0)]).tolist() == [False, False, True]
+    assert constraint_mask(columns, [NutrientConstraint("calories", "lt", 500.0)]).tolist() == [False, False, True]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from quantization import QuantizedIndex
+
+
+def exact_top(vectors, query, limit):
+    scores = (vectors @ query) / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return set(np.argsort(-scores)[:limit].tolist())
+
+
+@pytest.fixture
+def vectors():
+    # Clustered like sentence embeddings of similar meals, with the MiniLM dimension
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((100, 384))
+    return (centers[rng.integers(len(centers), size=2000)] + 0.5 * rng.standard_normal((2000, 384))).astype(np.float32)
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_quantized_recall(vectors, mode):
+    index = QuantizedIndex(vectors, mode, oversampling=4.0)
+    rng = np.random.default_rng(1)
+    recalls = []
+    for _ in range(20):
+        query = vectors[rng.integers(len(vectors))] + 0.3 * rng.standard_normal(vectors.shape[1]).astype(np.float32)
+        rows, scores = index.search(query, limit=10)
+        recalls.append(len(set(rows.tolist()) & exact_top(vectors, query, 10)) / 10)
+        assert np.all(np.diff(scores) <= 0)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_search_is_restricted_to_rows(vectors):
+    index = QuantizedIndex(vectors, "int8")
+    allowed = np.arange(0, len(vectors), 7)
+    rows, _ = index.search(vectors[3], limit=10, rows=allowed)
+    assert set(rows.tolist()) <= set(allowed.tolist())
+    assert len(set(rows.tolist()) & {int(allowed[row]) for row in exact_top(vectors[allowed], vectors[3], 10)}) >= 9
+
+
+def test_cached_codes_are_rebuilt_for_a_changed_index(tmp_path, vectors):
+    source = tmp_path / "meals.index"
+    source.write_bytes(vectors.tobytes())
+    first = QuantizedIndex(vectors, "int8", codes_path=str(source))
+
+    changed = vectors[::-1].copy()
+    source.write_bytes(changed.tobytes() + b"\0")  # Same row count, different contents and size
+    second = QuantizedIndex(changed, "int8", codes_path=str(source))
+
+    assert not np.array_equal(np.asarray(first.codes), np.asarray(second.codes))
+    assert np.array_equal(np.asarray(second.codes), np.asarray(QuantizedIndex(changed, "int8").codes))
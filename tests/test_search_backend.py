@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pytest
+
+from nutrients import NutrientConstraint
+from search_backend import LocalIndexBackend, write_flat_index
+
+
+# Rows shaped like metadata.json, which has no sugar column
+MEALS = [
+    {"name": "Salad", "calories": "350", "total_fat": "10% Daily Value", "total_carb": "20g grams", "protein": "15g grams"},
+    {"name": "Burger", "calories": "900", "total_fat": "60% Daily Value", "total_carb": "70g grams", "protein": "40g grams"},
+    {"name": "Soup", "calories": "200", "total_fat": "5% Daily Value", "total_carb": "25g grams", "protein": "8g grams"},
+    {"name": "Pasta", "calories": "700", "total_fat": "30% Daily Value", "total_carb": "90g grams", "protein": "25g grams"},
+]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    vectors = np.eye(len(MEALS), 8, dtype=np.float32) + 0.1
+    index_path = str(tmp_path / "meals.index")
+    write_flat_index(index_path, [vectors], 8)
+    metadata_path = tmp_path / "metadata.json"
+    metadata_path.write_text(json.dumps(MEALS), encoding="utf-8")
+    return LocalIndexBackend(index_path, str(metadata_path))
+
+
+def names(hits):
+    return [hit.payload["name"] for hit in hits]
+
+
+def query_for(row):
+    return np.eye(len(MEALS), 8, dtype=np.float32)[row]
+
+
+def test_unconstrained_search_ranks_by_similarity(backend):
+    assert names(backend.search(query_for(1), limit=2))[0] == "Burger"
+
+
+def test_constraints_pre_filter_rows(backend):
+    hits = backend.search(query_for(1), limit=4, constraints=[NutrientConstraint("calories", "lt", 500.0)])
+    assert sorted(names(hits)) == ["Salad", "Soup"]
+
+
+def test_constraints_on_missing_nutrients_are_ignored(backend):
+    hits = backend.search(query_for(0), limit=4, constraints=[NutrientConstraint("sugar", "eq", 0.0)])
+    assert len(hits) == len(MEALS)
+
+
+def test_unmatched_target_is_relaxed_to_hard_bounds(backend):
+    constraints = [NutrientConstraint("calories", "about", 2000.0), NutrientConstraint("protein", "gte", 20.0)]
+    hits = backend.search(query_for(0), limit=4, constraints=constraints)
+    assert sorted(names(hits)) == ["Burger", "Pasta"]
+
+
+def test_unmatched_hard_bound_is_not_relaxed(backend):
+    assert backend.search(query_for(0), limit=4, constraints=[NutrientConstraint("calories", "gt", 5000.0)]) == []
+
+
+def test_search_batch_matches_search(backend):
+    queries = np.stack([query_for(row) for row in range(len(MEALS))])
+    constraints = [None, [NutrientConstraint("calories", "about", 2000.0)], None, [NutrientConstraint("protein", "lt", 10.0)]]
+    results = backend.search_batch(queries, limit=3, constraints=constraints)
+    for query, query_constraints, hits in zip(queries, constraints, results):
+        assert names(hits) == names(backend.search(query, limit=3, constraints=query_constraints))
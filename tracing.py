@@ -0,0 +1,380 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+# Upper bounds in seconds of the latency histogram buckets, from 1 ms to 1 min
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed bucket bounds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket that contains it.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: Estimated value, or 0.0 without observations.
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Tracer:
+    """
+    Collects per-stage spans, counters and latency histograms in process.
+
+    Every finished span adds its duration to the ``stage_duration_seconds``
+    histogram of its stage, so a regression shows up as one stage getting
+    slower. The most recent spans are kept with their parent for inspecting
+    single requests. All methods are thread-safe, and spans nest separately
+    in every thread and asyncio task.
+    """
+
+    def __init__(self, max_spans=1000, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.spans = deque(maxlen=max_spans)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        # Open spans of the current thread or asyncio task, innermost last
+        self._stack = ContextVar(f"tracer_spans_{id(self)}", default=())
+        # Innermost open stage of every thread, read by the sampling profiler
+        self.active_stages = {}
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): Counter name, e.g. "cache_hits_total".
+            value (float): Amount to add.
+            **labels: Label values identifying the series.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Records a value in a histogram.
+
+        Args:
+            name (str): Histogram name, e.g. "llm_time_to_first_token_seconds".
+            value (float): Observed value in seconds.
+            **labels: Label values identifying the series.
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """
+        Times a pipeline stage.
+
+        Args:
+            stage (str): Stage name, e.g. "encode" or "search".
+            **attributes: Extra details stored with the span.
+
+        Yields:
+            dict: The span record, to which attributes can be added while it runs.
+        """
+        stack = self._stack.get()
+        thread_id = threading.get_ident()
+
+        record = {
+            "stage": stage,
+            "parent": stack[-1]["stage"] if stack else None,
+            "start": time.time(),
+            "attributes": attributes,
+        }
+        token = self._stack.set(stack + (record,))
+        self.active_stages[thread_id] = stage
+        started = time.perf_counter()
+        error = False
+        try:
+            yield record
+        except BaseException:
+            error = True
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self._stack.reset(token)
+            if stack:
+                self.active_stages[thread_id] = stack[-1]["stage"]
+            else:
+                self.active_stages.pop(thread_id, None)
+
+            record["duration"] = duration
+            record["error"] = error
+            self.observe("stage_duration_seconds", duration, stage=stage)
+            self.increment("stage_calls_total", stage=stage)
+            if error:
+                self.increment("stage_errors_total", stage=stage)
+            with self._lock:
+                self.spans.append(record)
+
+    def traced(self, stage=None):
+        """
+        Decorator that wraps every call of a function in a span.
+
+        Args:
+            stage (str): Stage name; defaults to the function name.
+        """
+        def decorator(function):
+            name = stage or function.__name__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_dict(self, recent_spans=50):
+        """
+        Exports the collected metrics as a JSON-serializable dictionary.
+
+        Args:
+            recent_spans (int): Number of most recent spans to include.
+
+        Returns:
+            dict: Counters, histogram summaries per series and recent spans.
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            spans = list(self.spans)[-recent_spans:] if recent_spans else []
+        return {"counters": counters, "histograms": histograms, "spans": spans}
+
+    def to_json(self, recent_spans=50):
+        return json.dumps(self.to_dict(recent_spans), default=str)
+
+    def to_prometheus(self):
+        """
+        Exports counters and histograms in the Prometheus text format.
+
+        Returns:
+            str: Metric families with ``# TYPE`` headers.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+            previous = None
+            for (name, labels), value in counters:
+                if name != previous:
+                    lines.append(f"# TYPE {name} counter")
+                    previous = name
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            previous = None
+            for (name, labels), histogram in histograms:
+                if name != previous:
+                    lines.append(f"# TYPE {name} histogram")
+                    previous = name
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Renders one line per stage with its call count and latency percentiles.
+
+        Returns:
+            str: Human-readable stage timings, slowest total first.
+        """
+        with self._lock:
+            stages = [
+                (dict(labels).get("stage"), histogram)
+                for (name, labels), histogram in self.histograms.items()
+                if name == "stage_duration_seconds"
+            ]
+        stages.sort(key=lambda item: item[1].sum, reverse=True)
+        return "\n".join(
+            f"{stage:<24} calls={histogram.count:<5} total={histogram.sum:.3f}s "
+            f"p50={histogram.quantile(0.5):.3f}s p95={histogram.quantile(0.95):.3f}s max={histogram.max:.3f}s"
+            for stage, histogram in stages
+        )
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads at a fixed interval.
+
+    Samples are attributed to the tracer stage that was open on the sampled
+    thread, so a slow stage can be broken down into the functions it spends
+    its time in without instrumenting them.
+    """
+
+    def __init__(self, tracer, interval=0.005, max_depth=8):
+        self.tracer = tracer
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stage = self.tracer.active_stages.get(thread_id)
+                if stage is not None:
+                    self.samples[(stage, self._stack(frame))] += 1
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def top(self, limit=20):
+        """
+        Returns the most frequently sampled stacks.
+
+        Args:
+            limit (int): Maximum number of stacks.
+
+        Returns:
+            list[dict]: Stage, stack (outermost frame first) and sample count.
+        """
+        return [
+            {"stage": stage, "stack": stack, "samples": count}
+            for (stage, stack), count in self.samples.most_common(limit)
+        ]
+
+    def collapsed(self):
+        """
+        Renders the samples in the collapsed-stack format read by flame graph tools.
+
+        Returns:
+            str: One "stage;frame;frame count" line per distinct stack.
+        """
+        return "\n".join(f"{stage};{stack} {count}" for (stage, stack), count in self.samples.items())
+
+
+# Process-wide tracer shared by the pipeline, the service and the batch jobs
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+
+
+def start_profiler_from_env(interval=None):
+    """
+    Starts the sampling profiler when ``MEAL_PROFILE`` is set to "1".
+
+    Args:
+        interval (float): Seconds between samples; defaults to ``MEAL_PROFILE_INTERVAL`` or 5 ms.
+
+    Returns:
+        SamplingProfiler | None: The running profiler, or None when profiling is disabled.
+    """
+    if os.environ.get("MEAL_PROFILE") != "1":
+        return None
+    interval = interval or float(os.environ.get("MEAL_PROFILE_INTERVAL", "0.005"))
+    return SamplingProfiler(tracer, interval=interval).start()
@@ -1,13 +1,330 @@
-from pymongo import MongoClient
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-from uuid import uuid4  # Import to generate a UUID
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 
 
-def get_user_profile():
+@lru_cache(maxsize=None)
+def get_mongo_client(uri="mongodb://localhost:27017/"):
+    """
+    Returns the shared MongoDB client for a server.
+
+    ``MongoClient`` keeps its own connection pool, so one instance per process
+    is reused by every call instead of reconnecting each time.
+
+    Args:
+        uri (str): MongoDB connection string.
+
+    Returns:
+        MongoClient: Shared client.
+    """
+    from pymongo import MongoClient
+
+    return MongoClient(uri)
+
+
+def _document_id(user_id):
+    # Profiles inserted by MongoDB have ObjectId keys, but callers pass them around as strings
+    from bson import ObjectId
+
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return ObjectId(user_id)
+    return user_id
+
+
+class ProfileRepository:
+    """
+    User profiles in MongoDB with an in-process read-through cache.
+
+    Profiles are cached by their ``_id`` in a least recently used dictionary,
+    so repeated lookups of the same user cost no database round-trip. Every
+    write goes to MongoDB first and then replaces the cached copy, so the
+    cache never serves a profile older than the last write from this process.
+    Writes from other processes, such as the import CLI, are picked up once
+    the cached entry is ``ttl`` seconds old. Cached profiles are returned as
+    copies with ``_id`` as a string.
+    """
+
+    def __init__(self, db_name="Food_recommendation", collection_name="user_profile",
+                 uri="mongodb://localhost:27017/", client=None, max_entries=10000, ttl=300):
+        self.collection = (client or get_mongo_client(uri))[db_name][collection_name]
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._profiles = OrderedDict()
+        # name -> (_id, stored_at) of the newest profile with that name, and _id -> name to drop it in O(1)
+        self._names = {}
+        self._name_of = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _forget_name(self, user_id):
+        # Called with the lock held; drops the name entry that points at user_id, if any
+        name = self._name_of.pop(user_id, None)
+        if name is not None:
+            self._names.pop(name, None)
+
+    def _drop(self, user_id):
+        # Called with the lock held
+        self._profiles.pop(user_id, None)
+        self._forget_name(user_id)
+
+    def _store(self, profile, name=None):
+        # name marks the profile as the newest one with that name, e.g. one just inserted
+        profile = dict(profile, _id=str(profile["_id"]))
+        stored_at = time.monotonic()
+        with self._lock:
+            self._profiles[profile["_id"]] = (profile, stored_at)
+            self._profiles.move_to_end(profile["_id"])
+            if name is not None:
+                self._forget_name(profile["_id"])
+                previous = self._names.get(name)
+                if previous is not None:
+                    self._name_of.pop(previous[0], None)
+                self._names[name] = (profile["_id"], stored_at)
+                self._name_of[profile["_id"]] = name
+            while len(self._profiles) > self.max_entries:
+                # Name entries only point at cached profiles, so they are bounded by max_entries too
+                self._forget_name(self._profiles.popitem(last=False)[0])
+        return dict(profile)
+
+    @staticmethod
+    def _name(profile):
+        name = profile.get("name")
+        return name.strip() if isinstance(name, str) else None
+
+    def invalidate(self, user_id=None):
+        """
+        Drops one cached profile, or all of them.
+
+        Args:
+            user_id (ObjectId | str): Profile to drop; None drops every profile.
+        """
+        with self._lock:
+            if user_id is None:
+                self._profiles.clear()
+                self._names.clear()
+                self._name_of.clear()
+            else:
+                self._drop(str(user_id))
+
+    def cached(self, user_id):
+        """
+        Returns a profile only if it is cached, without touching MongoDB.
+
+        Args:
+            user_id (ObjectId | str): MongoDB ``_id`` of the profile.
+
+        Returns:
+            dict | None: Copy of the profile, or None if it is not cached or has expired.
+        """
+        with self._lock:
+            entry = self._profiles.get(str(user_id))
+            if entry is None:
+                return None
+            profile, stored_at = entry
+            if self._expired(stored_at):
+                self._drop(str(user_id))
+                return None
+            self._profiles.move_to_end(str(user_id))
+            return dict(profile)
+
+    def get(self, user_id):
+        """
+        Returns a profile by its ``_id``, reading MongoDB only on a cache miss.
+
+        Args:
+            user_id (ObjectId | str): MongoDB ``_id`` of the profile.
+
+        Returns:
+            dict | None: Copy of the profile, or None if there is no such profile.
+        """
+        profile = self.cached(user_id)
+        if profile is not None:
+            return profile
+
+        document = self.collection.find_one({"_id": _document_id(user_id)})
+        return None if document is None else self._store(document)
+
+    def find_by_name(self, name):
+        """
+        Returns the most recently saved profile of a returning user.
+
+        Args:
+            name (str): Name the user entered.
+
+        Returns:
+            dict | None: Copy of the profile, or None for a new user.
+        """
+        name = name.strip()
+        with self._lock:
+            user_id, stored_at = self._names.get(name, (None, None))
+        # Another process may have saved a newer profile with this name, so the mapping expires too
+        if user_id is not None and not self._expired(stored_at):
+            profile = self.cached(user_id)
+            if profile is not None:
+                return profile
+
+        # Profiles are never renamed, so the newest one with the name is the current one
+        document = self.collection.find_one({"name": name}, sort=[("_id", -1)])
+        if document is None:
+            return None
+        return self._store(document, name=name)
+
+    def insert(self, profile):
+        """
+        Saves a new profile and caches it.
+
+        Like ``insert_one``, this sets ``_id`` on the given dictionary.
+
+        Args:
+            profile (dict): User profile.
+
+        Returns:
+            str: ``_id`` of the new profile.
+        """
+        self.collection.insert_one(profile)
+        return self._store(profile, name=self._name(profile))["_id"]
+
+    def insert_many(self, profiles, batch_size=1000):
+        """
+        Saves many new profiles with one ``insert_many`` per batch.
+
+        Args:
+            profiles (Iterable[dict]): User profiles, e.g. from an import file.
+            batch_size (int): Number of profiles sent per request.
+
+        Returns:
+            list[str]: ``_id`` of each profile, in input order.
+        """
+        inserted_ids = []
+        batch = []
+
+        def flush():
+            # Unordered inserts let the server write a batch in parallel
+            self.collection.insert_many(batch, ordered=False)
+            inserted_ids.extend(self._store(profile, name=self._name(profile))["_id"] for profile in batch)
+            batch.clear()
+
+        for profile in profiles:
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        return inserted_ids
+
+    def upsert_many(self, profiles, batch_size=1000):
+        """
+        Inserts or replaces many profiles with one bulk write per batch.
+
+        Profiles with an ``_id`` replace the stored document, the others are
+        inserted. The cached copies of every written profile are replaced.
+
+        Args:
+            profiles (Iterable[dict]): User profiles.
+            batch_size (int): Number of profiles sent per request.
+
+        Returns:
+            dict: Number of ``inserted``, ``updated`` and ``upserted`` profiles.
+        """
+        from pymongo import InsertOne, ReplaceOne
+
+        stats = {"inserted": 0, "updated": 0, "upserted": 0}
+        batch = []
+
+        def flush():
+            operations = []
+            for profile in batch:
+                if "_id" in profile:
+                    document = dict(profile, _id=_document_id(profile["_id"]))
+                    operations.append(ReplaceOne({"_id": document["_id"]}, document, upsert=True))
+                else:
+                    operations.append(InsertOne(profile))
+            result = self.collection.bulk_write(operations, ordered=False)
+            stats["inserted"] += result.inserted_count
+            stats["updated"] += result.modified_count
+            stats["upserted"] += result.upserted_count
+
+            for profile, operation in zip(batch, operations):
+                name = self._name(profile)
+                if isinstance(operation, InsertOne):
+                    # A new document is the newest with its name
+                    self._store(profile, name=name)
+                    continue
+                # A replaced one may not be, and may have been renamed, so its name is looked up again
+                with self._lock:
+                    self._drop(str(profile["_id"]))
+                    if name is not None and name in self._names:
+                        self._name_of.pop(self._names.pop(name)[0], None)
+                self._store(profile)
+            batch.clear()
+
+        for profile in profiles:
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        return stats
+
+    def update(self, user_id, changes):
+        """
+        Updates some fields of a stored profile.
+
+        Args:
+            user_id (ObjectId | str): MongoDB ``_id`` of the profile.
+            changes (dict): Fields to set.
+
+        Returns:
+            dict | None: Updated profile, or None if there is no such profile.
+        """
+        from pymongo import ReturnDocument
+
+        document = self.collection.find_one_and_update(
+            {"_id": _document_id(user_id)}, {"$set": changes}, return_document=ReturnDocument.AFTER
+        )
+        self.invalidate(user_id)
+        return None if document is None else self._store(document)
+
+
+@lru_cache(maxsize=None)
+def get_profile_repository(db_name="Food_recommendation", collection_name="user_profile"):
+    """
+    Returns the process-wide profile repository of a collection.
+
+    Args:
+        db_name (str): Name of the database.
+        collection_name (str): Name of the profile collection.
+
+    Returns:
+        ProfileRepository: Shared repository.
+    """
+    return ProfileRepository(db_name, collection_name)
+
+
+def get_user_profile(name=None):
+    """
+    Asks the user for their profile on the command line.
+
+    Args:
+        name (str): Name already entered, e.g. while looking up a returning user.
+
+    Returns:
+        dict: The new profile.
+    """
   
     # Collect user inputs
-    name = input("Enter your name: ").strip()
+    name = name or input("Enter your name: ").strip()
     
     while True:
         try:
@@ -48,18 +365,11 @@ def get_user_profile():
 def add_dictionary_to_mongo(my_db, my_collection, my_dic_data):
 
     try:
-        # Connect to the MongoDB server (adjust the URI as needed)
-        client = MongoClient("mongodb://localhost:27017/")
-        
-        # Access the database and collection
-        db = client[my_db]
-        collection = db[my_collection]
-        
-        # Insert the dictionary as a document
-        result = collection.insert_one(my_dic_data)
+        # Insert through the shared repository, which reuses the pooled client and caches the profile
+        inserted_id = get_profile_repository(my_db, my_collection).insert(my_dic_data)
         
         # Return the inserted ID
-        return {"inserted_id": str(result.inserted_id)}
+        return {"inserted_id": inserted_id}
     except Exception as e:
         return {"error": str(e)}
     
@@ -67,74 +377,25 @@ def add_dictionary_to_mongo(my_db, my_collection, my_dic_data):
 
 def vector_db_user_profile(profile, qdrant_url="http://localhost:6338", collection_name="user_profile"):
     """
-    Creates a vector database from the profile dictionary and saves it in Qdrant.
+    Creates a vector from the profile dictionary and saves it in Qdrant.
+
+    The profile is upserted by its MongoDB ``_id`` into a collection that is
+    only created once, so earlier profiles are kept.
 
     Args:
         profile (dict): Dictionary containing user profile data.
         qdrant_url (str): URL of the Qdrant instance (default: "http://localhost:6338").
-        collection_name (str): Name of the collection in Qdrant (default: "user_profiles").
+        collection_name (str): Name of the collection in Qdrant (default: "user_profile").
     
     Returns:
         str: Message indicating the result of the operation.
     """
-    try:
-        # Initialize Qdrant client
-        client = QdrantClient(url=qdrant_url)
-
-        # Initialize the SentenceTransformer model
-        encoder = SentenceTransformer("all-MiniLM-L6-v2")
-
-        # Extract and encode the textual fields
-        dietary_restrictions_vector = encoder.encode(profile["dietary_restrictions"] or "")
-        dietary_preferences_vector = encoder.encode(profile["dietary_preferences"] or "")
-
-        # Normalize the numerical fields (scale to [0, 1])
-        weight_normalized = profile["weight_kg"] / 200.0  # Assuming a max weight of 200 kg
-        height_normalized = profile["height_cm"] / 250.0  # Assuming a max height of 250 cm
-
-        # Combine all features into a single vector
-        combined_vector = list(dietary_restrictions_vector) + list(dietary_preferences_vector) + [
-            weight_normalized,
-            height_normalized,
-        ]
-
-        # Create the Qdrant collection if it doesn't exist
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=len(combined_vector),  # Length of the combined vector
-                distance=models.Distance.COSINE,
-            ),
-        )
-
-        # Generate a UUID for Qdrant point ID
-        qdrant_point_id = str(uuid4())  # Use a UUID as the Qdrant point ID
-
-        # Prepare payload
-        payload = {
-            "name": profile["name"],
-            "weight_kg": profile["weight_kg"],
-            "height_cm": profile["height_cm"],
-            "dietary_restrictions": profile["dietary_restrictions"],
-            "dietary_preferences": profile["dietary_preferences"],
-        }
-
-        # Insert the vector and payload into the collection
-        client.upsert(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=qdrant_point_id,  # Use the generated UUID
-                    vector=combined_vector,
-                    payload=payload,
-                )
-            ],
-        )
-
-        return f"Vector for profile '{profile['name']}' successfully saved in Qdrant collection '{collection_name}' with ID '{qdrant_point_id}'."
+    # Imported here so using the MongoDB helpers does not load qdrant_client
+    import vectorizer_db_user_profile
 
-    except Exception as e:
-        return f"An error occurred: {e}"
+    return vectorizer_db_user_profile.vector_db_user_profile(
+        profile, qdrant_url=qdrant_url, collection_name=collection_name
+    )
     
 # new_user = get_user_profile()
 # print(new_user)
@@ -211,3 +472,16 @@ def vector_db_user_profile(profile, qdrant_url="http://localhost:6338", collecti
     
 
 
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Import user profiles from a JSON Lines file into MongoDB.")
+    parser.add_argument("path", help="File with one profile object per line")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.path, "r", encoding="utf-8") as file:
+        profiles = (json.loads(line) for line in file if line.strip())
+        stats = get_profile_repository().upsert_many(profiles, batch_size=args.batch_size)
+    print(f"Profiles inserted: {stats['inserted']}, updated: {stats['updated']}, upserted: {stats['upserted']}")
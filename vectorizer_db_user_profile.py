@@ -1,78 +1,226 @@
+from functools import lru_cache
+from uuid import NAMESPACE_URL, uuid4, uuid5
+
+import numpy as np
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-from bson.objectid import ObjectId
+from embedding_cache import get_encoder
 
-def vector_db_user_profile(profile, qdrant_url="http://localhost:6338", collection_name="user_profile"):
+
+PROFILE_COLLECTION = "user_profile"
+
+# Namespace for deterministic profile point IDs derived from the MongoDB _id
+PROFILE_ID_NAMESPACE = uuid5(NAMESPACE_URL, "food-recommendation/user-profiles")
+
+
+def profile_point_id(user_id):
     """
-    Creates a vector database from the profile dictionary and saves it in Qdrant.
+    Derives the Qdrant point ID of a profile from its MongoDB ``_id``.
+
+    Qdrant only accepts integers and UUIDs as point IDs, so the ObjectId is
+    mapped to a stable UUID and kept in the payload as ``user_id``.
 
     Args:
-        profile (dict): Dictionary containing user profile data.
-        qdrant_url (str): URL of the Qdrant instance (default: "http://localhost:6338").
-        collection_name (str): Name of the collection in Qdrant (default: "user_profiles").
-    
+        user_id (ObjectId | str): MongoDB ``_id`` of the profile.
+
     Returns:
-        str: Message indicating the result of the operation.
+        str: UUID that is the same every time the profile is saved.
     """
-    try:
-        # Initialize Qdrant client
-        client = QdrantClient(url=qdrant_url)
-
-        # Initialize the SentenceTransformer model
-        encoder = SentenceTransformer("all-MiniLM-L6-v2")
-
-        # Extract and encode the textual fields
-        dietary_restrictions_vector = encoder.encode(profile["dietary_restrictions"])
-        dietary_preferences_vector = encoder.encode(profile["dietary_preferences"])
-
-        # Normalize the numerical fields (scale to [0, 1])
-        weight_normalized = profile["weight_kg"] / 200.0  # Assuming a max weight of 200 kg
-        height_normalized = profile["height_cm"] / 250.0  # Assuming a max height of 250 cm
-
-        # Combine all features into a single vector
-        combined_vector = list(dietary_restrictions_vector) + list(dietary_preferences_vector) + [
-            weight_normalized,
-            height_normalized,
-        ]
-
-        # Create the Qdrant collection if it doesn't exist
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=len(combined_vector),  # Length of the combined vector
-                distance=models.Distance.COSINE,
-            ),
-        )
+    return str(uuid5(PROFILE_ID_NAMESPACE, str(user_id)))
+
 
-        # Insert the vector and payload into the collection
-        payload = {
-            "name": profile["name"],
-            "weight_kg": profile["weight_kg"],
-            "height_cm": profile["height_cm"],
-            "dietary_restrictions": profile["dietary_restrictions"],
-            "dietary_preferences": profile["dietary_preferences"],
-            "user_id": str(profile["_id"]),  # Convert ObjectId to string for JSON compatibility
-        }
-
-        client.upsert(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=str(profile["_id"]),  # Use the MongoDB ObjectId as the ID
-                    vector=combined_vector,
-                    payload=payload,
-                )
-            ],
+def profile_vectors(profiles, encoder):
+    """
+    Builds the combined vectors of several profiles with one batched encode.
+
+    Each vector is the dietary restrictions embedding, the dietary preferences
+    embedding, and the weight and height scaled to [0, 1].
+
+    Args:
+        profiles (list[dict]): User profiles.
+        encoder: Sentence encoder, e.g. from ``get_encoder``.
+
+    Returns:
+        numpy.ndarray: One combined vector per profile.
+    """
+    texts = [profile["dietary_restrictions"] or "" for profile in profiles] + [
+        profile["dietary_preferences"] or "" for profile in profiles
+    ]
+    encoded = encoder.encode(texts)
+    restrictions, preferences = encoded[:len(profiles)], encoded[len(profiles):]
+
+    # Normalize the numerical fields (scale to [0, 1])
+    body = np.array(
+        [[profile["weight_kg"] / 200.0, profile["height_cm"] / 250.0] for profile in profiles],  # Assuming a max weight of 200 kg and height of 250 cm
+        dtype=np.float32,
+    ).reshape(len(profiles), 2)
+
+    return np.hstack([restrictions, preferences, body])
+
+
+def profile_payload(profile):
+    """
+    Creates the Qdrant payload stored next to a profile vector.
+
+    Args:
+        profile (dict): User profile.
+
+    Returns:
+        dict: Profile fields, with the MongoDB ``_id`` as ``user_id`` when present.
+    """
+    payload = {
+        "name": profile["name"],
+        "weight_kg": profile["weight_kg"],
+        "height_cm": profile["height_cm"],
+        "dietary_restrictions": profile["dietary_restrictions"],
+        "dietary_preferences": profile["dietary_preferences"],
+    }
+    if "_id" in profile:
+        payload["user_id"] = str(profile["_id"])  # Convert ObjectId to string for JSON compatibility
+    return payload
+
+
+class ProfileVectorStore:
+    """
+    Append-only store of user profile vectors in Qdrant.
+
+    The collection is created once and profiles are upserted by their MongoDB
+    ``_id``, so saving a profile never removes the other users.
+    """
+
+    def __init__(self, qdrant_url="http://localhost:6338", collection_name=PROFILE_COLLECTION, client=None, encoder=None):
+        self.client = client or QdrantClient(url=qdrant_url)
+        self.collection_name = collection_name
+        self.encoder = encoder or get_encoder("all-MiniLM-L6-v2")
+        self._collection_ready = False
+
+    def ensure_collection(self):
+        """
+        Creates the profile collection if it does not exist yet.
+        """
+        if self._collection_ready:
+            return
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=models.VectorParams(
+                    size=2 * self.encoder.get_sentence_embedding_dimension() + 2,  # Two text embeddings plus weight and height
+                    distance=models.Distance.COSINE,
+                ),
+            )
+        self._collection_ready = True
+
+    def upsert_profiles(self, profiles, batch_size=256):
+        """
+        Inserts or updates many profiles.
+
+        Args:
+            profiles (Iterable[dict]): User profiles, ideally with their MongoDB ``_id``.
+            batch_size (int): Number of profiles encoded and upserted per request.
+
+        Returns:
+            list[str]: Point IDs of the saved profiles.
+        """
+        self.ensure_collection()
+
+        point_ids = []
+        batch = []
+
+        def flush():
+            vectors = profile_vectors(batch, self.encoder)
+            ids = [
+                profile_point_id(profile["_id"]) if "_id" in profile else str(uuid4())
+                for profile in batch
+            ]
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=[
+                    models.PointStruct(id=point_id, vector=vector.tolist(), payload=profile_payload(profile))
+                    for point_id, vector, profile in zip(ids, vectors, batch)
+                ],
+            )
+            point_ids.extend(ids)
+            batch.clear()
+
+        for profile in profiles:
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        return point_ids
+
+    def upsert_profile(self, profile):
+        """
+        Inserts or updates a single profile.
+
+        Args:
+            profile (dict): User profile.
+
+        Returns:
+            str: Point ID of the saved profile.
+        """
+        return self.upsert_profiles([profile])[0]
+
+    def find_similar_users(self, profile, limit=5):
+        """
+        Finds the stored users whose profiles are most similar to a profile.
+
+        Args:
+            profile (dict): User profile to compare against.
+            limit (int): Maximum number of similar users.
+
+        Returns:
+            list[ScoredPoint]: Similar profiles, excluding the profile itself.
+        """
+        self.ensure_collection()
+
+        query_filter = None
+        if "_id" in profile:
+            query_filter = models.Filter(
+                must_not=[models.HasIdCondition(has_id=[profile_point_id(profile["_id"])])]
+            )
+
+        return self.client.search(
+            collection_name=self.collection_name,
+            query_vector=profile_vectors([profile], self.encoder)[0].tolist(),
+            query_filter=query_filter,
+            limit=limit,
         )
 
-        return f"Vector for profile '{profile['name']}' successfully saved in Qdrant collection '{collection_name}'."
 
-    except Exception as e:
-        return f"An error occurred: {e}"
+@lru_cache(maxsize=None)
+def get_profile_vector_store(qdrant_url="http://localhost:6338", collection_name=PROFILE_COLLECTION):
+    """
+    Returns the process-wide profile vector store for a Qdrant collection.
 
+    Args:
+        qdrant_url (str): URL of the Qdrant instance.
+        collection_name (str): Name of the profile collection.
 
-    # result = create_and_save_vector_db(profile)
-    # print(result)
+    Returns:
+        ProfileVectorStore: Shared store.
+    """
+    return ProfileVectorStore(qdrant_url=qdrant_url, collection_name=collection_name)
 
 
+def vector_db_user_profile(profile, qdrant_url="http://localhost:6338", collection_name="user_profile"):
+    """
+    Creates a vector from the profile dictionary and saves it in Qdrant.
 
+    Args:
+        profile (dict): Dictionary containing user profile data.
+        qdrant_url (str): URL of the Qdrant instance (default: "http://localhost:6338").
+        collection_name (str): Name of the collection in Qdrant (default: "user_profile").
+
+    Returns:
+        str: Message indicating the result of the operation.
+    """
+    try:
+        store = get_profile_vector_store(qdrant_url, collection_name)
+        point_id = store.upsert_profile(profile)
+
+        return f"Vector for profile '{profile['name']}' successfully saved in Qdrant collection '{collection_name}' with ID '{point_id}'."
+
+    except Exception as e:
+        return f"An error occurred: {e}"